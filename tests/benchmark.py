@@ -0,0 +1,111 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import youtube_comment_downloader
+from youtube_comment_downloader.downloader import YoutubeCommentDownloader
+from youtube_comment_downloader.writers import Writer
+
+from .fake_youtube import FakeVideo, FakeYoutubeAdapter, unthrottled
+
+SIZES = {'1k': 1000, '100k': 100000, '1M': 1000000}
+
+
+class StageTimer:
+
+    def __init__(self):
+        self.stages = {}
+
+    def wrap(self, stage, function):
+        def timed(*args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.stages[stage] = self.stages.get(stage, 0.0) + time.perf_counter() - start_time
+        return timed
+
+
+@contextlib.contextmanager
+def fake_youtube(adapter, timer=None):
+    # Route every downloader created inside this block (including the one created by main) to the fake server
+    patched = {'__init__': YoutubeCommentDownloader.__init__}
+    if timer:
+        patched.update(bootstrap_comments=YoutubeCommentDownloader.bootstrap_comments,
+                       ajax_request=YoutubeCommentDownloader.ajax_request)
+
+    def __init__(self, *args, **kwargs):
+        patched['__init__'](self, *args, **kwargs)
+        unthrottled(self)
+        self.session.mount('https://www.youtube.com', adapter)
+        self.session.mount('https://consent.youtube.com', adapter)
+
+    YoutubeCommentDownloader.__init__ = __init__
+    writer = {'write': Writer.write, 'flush': Writer.flush}
+    if timer:
+        YoutubeCommentDownloader.bootstrap_comments = timer.wrap('bootstrap', patched['bootstrap_comments'])
+        YoutubeCommentDownloader.ajax_request = timer.wrap('requests', patched['ajax_request'])
+        Writer.write = timer.wrap('serialization', Writer.write)
+        Writer.flush = timer.wrap('serialization', Writer.flush)
+    try:
+        yield adapter
+    finally:
+        for name, function in patched.items():
+            setattr(YoutubeCommentDownloader, name, function)
+        for name, function in writer.items():
+            setattr(Writer, name, function)
+
+
+def run_pipeline(video, argv=(), memory=False, consent=True):
+    # Run main() against the fake server and report throughput, time per stage and (optionally) peak memory
+    adapter = FakeYoutubeAdapter([video], consent=consent)
+    timer = StageTimer()
+    with tempfile.TemporaryDirectory() as directory, fake_youtube(adapter, timer):
+        output = os.path.join(directory, 'comments.json')
+        if memory:
+            tracemalloc.start()
+        start_time = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            youtube_comment_downloader.main(['--youtubeid', video.video_id, '--output', output] + list(argv))
+        total = time.perf_counter() - start_time
+        peak = tracemalloc.get_traced_memory()[1] if memory else None
+        if memory:
+            tracemalloc.stop()
+        with open(output, 'rb') as fp:
+            comments = sum(1 for _ in fp)
+
+    # Time spent by the fake server is reported separately and not counted in the stage it was called from
+    stages = dict(timer.stages)
+    stages['fake server'] = adapter.server_time
+    stages['bootstrap'] = stages.get('bootstrap', 0.0) - (adapter.server_time - adapter.server_times.get('/youtubei/v1/next', 0.0))
+    stages['requests'] = stages.get('requests', 0.0) - adapter.server_times.get('/youtubei/v1/next', 0.0)
+    stages['extraction'] = total - sum(stages.values())
+    return {'comments': comments,
+            'requests': len(adapter.requests),
+            'seconds': round(total, 3),
+            'comments_per_second': round(comments / total, 1),
+            'stages': {stage: round(seconds, 3) for stage, seconds in stages.items()},
+            'peak_memory_mb': round(peak / 2 ** 20, 1) if peak is not None else None}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='End-to-end benchmark against an offline fake Youtube')
+    parser.add_argument('--sizes', nargs='+', default=['1k', '100k'], choices=sorted(SIZES))
+    parser.add_argument('--memory', action='store_true', help='Also measure peak memory (slower)')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help='Extra arguments passed to the downloader')
+    args = parser.parse_args(argv)
+
+    for size in args.sizes:
+        report = run_pipeline(FakeVideo.with_comments(SIZES[size], replies=0), args.args, memory=args.memory)
+        print(size, json.dumps(report))
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
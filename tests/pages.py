@@ -0,0 +1,204 @@
+import base64
+import random
+
+API_URL = '/youtubei/v1/next'
+CHANNEL_ID = 'UCuAXFkgsw1L7xaCfnd5JJOw'
+
+
+def token(*parts):
+    return base64.urlsafe_b64encode(':'.join(str(part) for part in parts).encode()).decode()
+
+
+def untoken(value):
+    return base64.urlsafe_b64decode(value.encode()).decode().split(':')
+
+
+def decode_varint(data, position):
+    value, shift = 0, 0
+    while True:
+        byte = data[position]
+        value |= (byte & 0x7f) << shift
+        position, shift = position + 1, shift + 7
+        if byte < 0x80:
+            return value, position
+
+
+def decode_message(data):
+    # Protobuf fields by number, length delimited values are returned as bytes
+    fields, position = {}, 0
+    while position < len(data):
+        key, position = decode_varint(data, position)
+        if key & 7 == 0:
+            value, position = decode_varint(data, position)
+        else:
+            length, position = decode_varint(data, position)
+            value, position = data[position:position + length], position + length
+        fields.setdefault(key >> 3, []).append(value)
+    return fields
+
+
+def synthesized_token(value):
+    # Parts of a first page token built by faststart.comment_token, in the same form as untoken, or None
+    data = base64.urlsafe_b64decode(value.encode())
+    if data[:1] != b'\x12':
+        return None
+    message = decode_message(data)
+    params = decode_message(decode_message(message[6][0])[4][0])
+    return ['comments', params[4][0].decode(), '0', str(params[6][0])]
+
+
+def continuation_endpoint(value):
+    return {'clickTrackingParams': 'CAAQg2ciEwi' + value[:12],
+            'commandMetadata': {'webCommandMetadata': {'sendPost': True, 'apiUrl': API_URL}},
+            'continuationCommand': {'token': value, 'request': 'CONTINUATION_REQUEST_TYPE_WATCH_NEXT'}}
+
+
+def continuation_item(value, button=False):
+    if button:
+        return {'continuationItemRenderer': {
+            'trigger': 'CONTINUATION_TRIGGER_ON_ITEM_SHOWN',
+            'button': {'buttonRenderer': {'style': 'STYLE_TEXT', 'size': 'SIZE_DEFAULT',
+                                          'text': {'runs': [{'text': 'Show more replies'}]},
+                                          'command': continuation_endpoint(value),
+                                          'trackingParams': 'CAEQ8FsiEwj'}}}}
+    return {'continuationItemRenderer': {'trigger': 'CONTINUATION_TRIGGER_ON_ITEM_SHOWN',
+                                         'continuationEndpoint': continuation_endpoint(value)}}
+
+
+def comment_view_model(cid):
+    return {'commentViewModel': {'commentViewModel': {
+        'commentKey': 'key-' + cid, 'commentSurfaceKey': 'surface-' + cid, 'commentId': cid,
+        'toolbarStateKey': 'toolbar-' + cid, 'toolbarSurfaceKey': 'toolbar-surface-' + cid,
+        'sharedKey': 'shared-' + cid, 'inlineRepliesKey': 'inline-' + cid,
+        'rendererContext': {'loggingContext': {'loggingDirectives': {
+            'trackingParams': 'CBEQ7rEKIhMI' + cid, 'visibility': {'types': '12'}}}}}}}
+
+
+def comment_thread(cid, replies_token=None):
+    renderer = dict(comment_view_model(cid))
+    renderer.update({'trackingParams': 'CAwQwnsYACITCOv', 'renderingPriority': 'RENDERING_PRIORITY_UNKNOWN',
+                     'isModeratedElqComment': False,
+                     'loggingDirectives': {'trackingParams': 'CAwQwnsYACITCOv', 'visibility': {'types': '12'}}})
+    if replies_token:
+        renderer['replies'] = {'commentRepliesRenderer': {
+            'contents': [continuation_item(replies_token)],
+            'trackingParams': 'CA0Qvnc', 'targetId': 'comment-replies-item-' + cid,
+            'viewReplies': {'buttonRenderer': {'text': {'runs': [{'text': 'replies'}]}}}}}
+    return {'commentThreadRenderer': renderer}
+
+
+def comment_mutations(cid, text, replies=0, votes='12', paid=None, hearted=False, published='3 days ago'):
+    mutations = [
+        {'entityKey': 'key-' + cid, 'type': 'ENTITY_MUTATION_TYPE_REPLACE', 'payload': {'commentEntityPayload': {
+            'key': 'key-' + cid,
+            'properties': {'commentId': cid, 'content': {'content': text},
+                           'publishedTime': published, 'replyLevel': int('.' in cid),
+                           'authorButtonA11y': '@user', 'toolbarStateKey': 'toolbar-' + cid,
+                           'translateButton': {'buttonViewModel': {'title': 'Translate to English'}}},
+            'author': {'channelId': CHANNEL_ID, 'displayName': '@user-' + cid[-5:],
+                       'avatarThumbnailUrl': 'https://yt3.ggpht.com/ytc/AIdro_' + cid + '=s88-c-k-c0x00ffffff-no-rj',
+                       'isVerified': False, 'isCurrentUser': False, 'isCreator': False, 'isArtist': False},
+            'toolbar': {'likeCountNotliked': votes, 'likeCountLiked': votes, 'likeCountA11y': votes + ' likes',
+                        'replyCount': str(replies) if replies else '', 'replyCountA11y': '',
+                        'likeInactiveTooltip': 'Like', 'likeActiveTooltip': 'Unlike'},
+            'avatar': {'image': {'sources': [{'url': 'https://yt3.ggpht.com/ytc/' + cid, 'width': 88, 'height': 88}]},
+                       'accessibilityText': 'user avatar'}}}},
+        {'entityKey': 'toolbar-' + cid, 'type': 'ENTITY_MUTATION_TYPE_REPLACE', 'payload': {
+            'engagementToolbarStateEntityPayload': {
+                'key': 'toolbar-' + cid, 'likeState': 'TOOLBAR_LIKE_STATE_INDIFFERENT',
+                'heartState': 'TOOLBAR_HEART_STATE_HEARTED' if hearted else 'TOOLBAR_HEART_STATE_UNHEARTED'}}},
+        {'entityKey': 'surface-' + cid, 'type': 'ENTITY_MUTATION_TYPE_REPLACE', 'payload': {
+            'commentSurfaceEntityPayload': dict(
+                {'key': 'surface-' + cid, 'voteCount': {'content': votes}},
+                **({'pdgCommentChip': {'pdgCommentChipRenderer': {'chipText': {'simpleText': paid}}}}
+                   if paid else {}))}},
+    ]
+    return mutations
+
+
+def response(target_id, items, mutations, reload=False):
+    action = {'targetId': target_id, 'continuationItems': items}
+    if reload:
+        action['slot'] = 'RELOAD_CONTINUATION_SLOT_BODY'
+    return {'responseContext': {'visitorData': 'CgtWVzF', 'serviceTrackingParams': [
+                {'service': 'GFEEDBACK', 'params': [{'key': 'logged_in', 'value': '0'}]}],
+                'mainAppWebResponseContext': {'loggedOut': True}},
+            'trackingParams': 'CAAQg2ciEwj',
+            'onResponseReceivedEndpoints': [
+                {'clickTrackingParams': 'CAAQg2ciEwj',
+                 ('reloadContinuationItemsCommand' if reload else 'appendContinuationItemsAction'): action}],
+            'frameworkUpdates': {'entityBatchUpdate': {'mutations': mutations,
+                                                       'timestamp': {'seconds': '1700000000', 'nanos': 0}}}}
+
+
+def comment_page(video_id, page, per_page=20, replies=3, pages=None, paid_every=0, seed=0):
+    rnd = random.Random(seed * 1000003 + page)
+    items, mutations = [], []
+    for index in range(per_page):
+        cid = 'Ugz%s%06d%04d' % (video_id[:6], page, index)
+        reply_count = rnd.randint(0, replies * 2) if replies else 0
+        items.append(comment_thread(cid, token('replies', video_id, cid, reply_count, 0) if reply_count else None))
+        paid = '$%d.00' % (index + 1) if paid_every and index % paid_every == 0 else None
+        mutations.extend(comment_mutations(cid, 'Comment %d on page %d ' % (index, page) * rnd.randint(1, 8),
+                                           reply_count, str(rnd.randint(0, 5000)), paid, hearted=index == 0))
+    if pages is None or page + 1 < pages:
+        items.append(continuation_item(token('comments', video_id, page + 1)))
+    return response('comments-section' if page else 'engagement-panel-comments-section',
+                    items, mutations, reload=page == 0)
+
+
+def reply_page(video_id, cid, total, offset, per_page=10):
+    items, mutations = [], []
+    for index in range(offset, min(offset + per_page, total)):
+        rid = '%s.%s%04d' % (cid, 'AAAAAAAAAA', index)
+        items.append(comment_view_model(rid))
+        mutations.extend(comment_mutations(rid, 'Reply %d' % index, published='1 week ago (edited)'))
+    if offset + per_page < total:
+        items.append(continuation_item(token('replies', video_id, cid, total, offset + per_page), button=True))
+    return response('comment-replies-item-' + cid, items, mutations)
+
+
+def post_attachment(index):
+    # Posts cycle through having no attachment, an image, several images, a video and a poll
+    image = {'backstageImageRenderer': {'image': {'thumbnails': [
+        {'url': 'https://yt3.ggpht.com/post%d=s288' % index, 'width': 288},
+        {'url': 'https://yt3.ggpht.com/post%d=s1080' % index, 'width': 1080}]}}}
+    return [None,
+            image,
+            {'postMultiImageRenderer': {'images': [image, image]}},
+            {'videoRenderer': {'videoId': 'vid%08d' % index, 'title': {'runs': [{'text': 'Video %d' % index}]}}},
+            {'pollRenderer': {'choices': [{'text': {'runs': [{'text': 'Yes'}]}}, {'text': {'runs': [{'text': 'No'}]}}],
+                              'totalVotes': {'simpleText': '1.2K votes'}}}][index % 5]
+
+
+def post_thread(pid, index, channel='@channel'):
+    renderer = {'postId': pid,
+                'authorText': {'runs': [{'text': channel}]},
+                'authorEndpoint': {'browseEndpoint': {'browseId': CHANNEL_ID, 'canonicalBaseUrl': '/' + channel}},
+                'contentText': {'runs': [{'text': 'Post %d ' % index}, {'text': 'with a link'}]},
+                'publishedTimeText': {'runs': [{'text': '%d days ago' % (index + 1)}]},
+                'voteCount': {'simpleText': str(index * 10)},
+                'actionButtons': {'commentActionButtonsRenderer': {'replyButton': {'buttonRenderer': {
+                    'text': {'simpleText': str(index)}, 'navigationEndpoint': {'browseEndpoint': {
+                        'browseId': CHANNEL_ID, 'params': 'Egljb21tdW5pdHk'}}}}}},
+                'trackingParams': 'CAEQ8FsiEwj'}
+    attachment = post_attachment(index)
+    if attachment:
+        renderer['backstageAttachment'] = attachment
+    return {'backstagePostThreadRenderer': {'post': {'backstagePostRenderer': renderer}, 'trackingParams': 'CAAQ'}}
+
+
+def post_id(channel, index):
+    return 'Ugkx%s%06d' % (channel.strip('@')[:6], index)
+
+
+def community_items(channel, page, per_page=10, pages=None):
+    items = [post_thread(post_id(channel, page * per_page + index), page * per_page + index, channel)
+             for index in range(per_page)]
+    if pages is None or page + 1 < pages:
+        items.append(continuation_item(token('community', channel, page + 1)))
+    return items
+
+
+def community_page(channel, page, per_page=10, pages=None):
+    return response('community-section', community_items(channel, page, per_page, pages), [])
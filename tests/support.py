@@ -0,0 +1,51 @@
+import json
+import threading
+import time
+
+from youtube_comment_downloader import main
+from youtube_comment_downloader.downloader import YoutubeCommentDownloader
+
+from .benchmark import fake_youtube
+from .pages import comment_page, continuation_endpoint, reply_page, token, untoken
+
+VIDEO_ID = 'dQw4w9WgXcQ'
+
+
+class PagedDownloader(YoutubeCommentDownloader):
+    # Serves comment and reply pages straight from pages.py, without any HTTP
+
+    def __init__(self, pages=3, latency=0):
+        super().__init__()
+        self.pages = pages
+        self.latency = latency
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def ajax_request(self, endpoint, ytcfg, retries=5, sleep=20, timeout=60, pause=None):
+        with self.lock:
+            self.requests += 1
+        time.sleep(self.latency)
+        kind, video_id, *rest = untoken(endpoint['continuationCommand']['token'])
+        if kind == 'comments':
+            return comment_page(video_id, int(rest[0]), pages=self.pages)
+        cid, total, offset = rest
+        return reply_page(video_id, cid, int(total), int(offset), per_page=2)
+
+
+def crawl(downloader, start=VIDEO_ID, **kwargs):
+    continuations = [continuation_endpoint(token('comments', start, 0))]
+    return list(downloader.crawl_comments(continuations, {}, None, 0, **kwargs))
+
+
+def download(adapter, tmp_path, *args):
+    # Download the (first) video of the fake server with main, returns the comments it wrote
+    output = str(tmp_path / 'comments.json')
+    with fake_youtube(adapter):
+        main(['--youtubeid', next(iter(adapter.videos)), '--output', output] + list(args))
+    with open(output) as fp:
+        return [json.loads(line) for line in fp]
+
+
+def without_time(comments):
+    # time_parsed depends on when the comment was downloaded
+    return [{key: value for key, value in comment.items() if key != 'time_parsed'} for comment in comments]
@@ -0,0 +1,75 @@
+import json
+import os
+
+import pytest
+
+from youtube_comment_downloader import main
+from youtube_comment_downloader.batch import download_batch, read_targets, video_id
+from youtube_comment_downloader.downloader import YoutubeCommentDownloader
+from youtube_comment_downloader.transport import Transport
+
+from .fake_youtube import FakeVideo, FakeYoutubeAdapter
+
+
+class FakeDownloader:
+
+    def get_comments_from_url(self, youtube_url, **kwargs):
+        if 'broken' in youtube_url:
+            yield {'cid': 'first'}
+            raise RuntimeError('Failed to set sorting')
+        for index in range(3):
+            yield {'cid': '%s-%d' % (youtube_url[-11:], index)}
+
+
+def test_that_video_ids_are_extracted_from_urls():
+    assert video_id('dQw4w9WgXcQ') == 'dQw4w9WgXcQ'
+    assert video_id('https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=1') == 'dQw4w9WgXcQ'
+    assert video_id('https://youtu.be/dQw4w9WgXcQ') == 'dQw4w9WgXcQ'
+    assert video_id('https://www.youtube.com/shorts/dQw4w9WgXcQ') == 'dQw4w9WgXcQ'
+
+
+def test_that_comments_and_blank_lines_are_skipped(tmp_path):
+    path = tmp_path / 'ids.txt'
+    path.write_text('# videos\ndQw4w9WgXcQ\n\n  ScMzIvxBSi4  \n')
+    assert read_targets(str(path)) == ['dQw4w9WgXcQ', 'ScMzIvxBSi4']
+
+
+def test_that_a_failing_video_does_not_abort_the_batch(tmp_path):
+    targets = ['dQw4w9WgXcQ', 'https://www.youtube.com/watch?v=broken00000', 'ScMzIvxBSi4']
+    manifest = download_batch(FakeDownloader(), targets, str(tmp_path), jobs=2)
+
+    assert [entry['id'] for entry in manifest['videos']] == ['dQw4w9WgXcQ', 'broken00000', 'ScMzIvxBSi4']
+    assert [entry['comments'] for entry in manifest['videos']] == [3, 1, 3]
+    assert manifest['failed'] == 1 and 'Failed to set sorting' in manifest['videos'][1]['error']
+    with open(os.path.join(str(tmp_path), 'ScMzIvxBSi4.json')) as fp:
+        assert [json.loads(line)['cid'] for line in fp] == ['ScMzIvxBSi4-%d' % i for i in range(3)]
+    with open(os.path.join(str(tmp_path), 'manifest.json')) as fp:
+        assert json.load(fp) == manifest
+
+
+def test_that_limit_is_applied_per_video(tmp_path):
+    manifest = download_batch(FakeDownloader(), ['dQw4w9WgXcQ', 'ScMzIvxBSi4'], str(tmp_path), limit=2)
+    assert [entry['comments'] for entry in manifest['videos']] == [2, 2]
+
+
+def test_that_duplicate_targets_are_downloaded_once(tmp_path):
+    targets = ['dQw4w9WgXcQ', 'https://www.youtube.com/watch?v=dQw4w9WgXcQ', 'ScMzIvxBSi4', 'dQw4w9WgXcQ']
+    manifest = download_batch(FakeDownloader(), targets, str(tmp_path), jobs=4)
+    assert [entry['id'] for entry in manifest['videos']] == ['dQw4w9WgXcQ', 'ScMzIvxBSi4']
+
+
+def test_that_a_video_without_configuration_is_a_failure(tmp_path):
+    video = FakeVideo(pages=1, filler=1000)
+    downloader = YoutubeCommentDownloader(transport=Transport(adapter=FakeYoutubeAdapter([video])))
+    manifest = download_batch(downloader, [video.video_id, 'missing0000'], str(tmp_path))
+    assert manifest['videos'][0]['comments'] > 0 and not manifest['videos'][0]['error']
+    assert manifest['failed'] == 1 and 'configuration' in manifest['videos'][1]['error']
+
+
+@pytest.mark.parametrize('option', [['--checkpoint', 'checkpoint.json'], ['--debug']])
+def test_that_checkpoint_and_debug_are_rejected_in_batch_mode(tmp_path, capsys, option):
+    path = tmp_path / 'ids.txt'
+    path.write_text('dQw4w9WgXcQ\n')
+    with pytest.raises(SystemExit):
+        main(['--input', str(path), '--output-dir', str(tmp_path / 'out')] + option)
+    assert 'batch downloads' in capsys.readouterr().out
@@ -0,0 +1,77 @@
+import pytest
+
+from youtube_comment_downloader.batches import MISSING_INT, column_batches, comment_batches, parse_columns, to_columns
+from youtube_comment_downloader.downloader import COMMENT_PAGE_KEYS, YoutubeCommentDownloader
+from youtube_comment_downloader.record import FIELDS
+from youtube_comment_downloader.timeparse import TimeParser
+
+from .fake_youtube import FakeVideo, FakeYoutubeAdapter, fake_downloader
+from .pages import comment_page
+
+COMMENTS = [{'cid': 'a', 'votes': '1.2K', 'replies': '', 'heart': True, 'reply': False, 'time_parsed': 1700000000.5},
+            {'cid': 'a.b', 'votes': '7', 'replies': '3', 'heart': False, 'reply': True}]
+
+
+def batches(video, **kwargs):
+    downloader = fake_downloader(FakeYoutubeAdapter([video]))
+    return list(downloader.get_comment_batches(video.video_id, **kwargs))
+
+
+def test_that_counts_and_timestamps_are_parsed():
+    columns = to_columns(COMMENTS, ('cid', 'votes', 'replies', 'heart', 'reply', 'time_parsed', 'paid'))
+    assert columns == {'cid': ['a', 'a.b'], 'votes': [1200, 7], 'replies': [0, 3], 'heart': [True, False],
+                       'reply': [False, True], 'time_parsed': [1700000000, None], 'paid': [None, None]}
+
+
+def test_that_batches_hold_every_comment_once():
+    video = FakeVideo(pages=3, filler=10000)
+    result = batches(video, batch_size=25, parse_time=False)
+    assert all(len(batch['cid']) == 25 for batch in result[:-1]) and 0 < len(result[-1]['cid']) <= 25
+    cids = [cid for batch in result for cid in batch['cid']]
+    assert len(cids) == len(set(cids)) > 60
+    assert 'time_parsed' not in result[0] and all(isinstance(votes, int) for votes in result[0]['votes'])
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'max_replies': 1}])
+def test_that_batches_match_the_downloaded_comments(kwargs):
+    video = FakeVideo(pages=2, filler=10000)
+    downloader = fake_downloader(FakeYoutubeAdapter([video]))
+    fields = tuple(field for field in FIELDS if field != 'time_parsed')
+    expected = to_columns(list(downloader.get_comments(video.video_id, parse_time=False, **kwargs)), fields)
+    result = batches(video, batch_size=7, parse_time=False, **kwargs)
+    assert {field: [value for batch in result for value in batch[field]] for field in fields} == expected
+    assert any(expected['paid'])
+
+
+def test_that_unknown_formats_are_rejected():
+    with pytest.raises(ValueError):
+        list(comment_batches(COMMENTS, format='pandas'))
+    with pytest.raises(ValueError):
+        list(column_batches([], format='pandas'))
+
+
+def test_that_numpy_batches_have_typed_columns():
+    numpy = pytest.importorskip('numpy')
+    batch, = comment_batches(COMMENTS, fields=('cid', 'votes', 'time_parsed', 'heart'), format='numpy')
+    assert batch['votes'].dtype == numpy.int64 and batch['heart'].dtype == numpy.bool_
+    assert list(batch['time_parsed']) == [1700000000, MISSING_INT]
+
+
+def test_that_arrow_batches_have_typed_columns():
+    pyarrow = pytest.importorskip('pyarrow')
+    batch, = comment_batches(COMMENTS, fields=('cid', 'votes', 'time_parsed', 'heart'), format='arrow')
+    assert batch.schema.field('votes').type == pyarrow.int64() and batch.num_rows == 2
+    assert batch.column('time_parsed').to_pylist() == [1700000000, None]
+
+
+@pytest.mark.parametrize('kind', ['dicts', 'columns'])
+def test_benchmark_batch_columns(benchmark, kind):
+    # A dict per comment (what get_comment_batches used to collect) against the columns built from the payloads
+    downloader = YoutubeCommentDownloader()
+    index = downloader.index_dict(comment_page('dQw4w9WgXcQ', 0, per_page=100, pages=1), COMMENT_PAGE_KEYS)
+    time_parser = TimeParser('en')
+    benchmark.group = 'batch columns'
+    if kind == 'dicts':
+        benchmark(lambda: to_columns(downloader.extract_comments(index, time_parser), FIELDS))
+    else:
+        benchmark(lambda: parse_columns(downloader.extract_columns(index, time_parser, FIELDS)))
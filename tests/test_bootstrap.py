@@ -0,0 +1,71 @@
+import json
+import tracemalloc
+
+import pytest
+
+from youtube_comment_downloader.bootstrap import extract_bootstrap
+from youtube_comment_downloader.downloader import YT_CFG_RE, YT_INITIAL_DATA_RE, YoutubeCommentDownloader
+
+from .fake_youtube import API_KEY, FakeVideo
+
+VIDEO = FakeVideo(filler=200000)
+HTML = VIDEO.watch_html()
+
+
+def chunked(text, size):
+    return [text[offset:offset + size] for offset in range(0, len(text), size)]
+
+
+def regex_bootstrap(html):
+    ytcfg = json.loads(YoutubeCommentDownloader.regex_search(html, YT_CFG_RE, default=''))
+    data = json.loads(YoutubeCommentDownloader.regex_search(html, YT_INITIAL_DATA_RE, default=''))
+    return ytcfg, data
+
+
+@pytest.mark.parametrize('size', [1, 7, 63, 64, 1000, 65536, len(HTML)])
+def test_that_objects_are_found_across_chunk_boundaries(size):
+    ytcfg, data = extract_bootstrap(chunked(HTML, size))
+    assert ytcfg['INNERTUBE_API_KEY'] == API_KEY
+    assert data == VIDEO.initial_data()
+
+
+def test_that_the_streaming_extractor_agrees_with_the_regex():
+    assert extract_bootstrap([HTML]) == regex_bootstrap(HTML)
+
+
+def test_that_other_ytcfg_calls_are_skipped():
+    html = ('<script>ytcfg.set({"CSI_SERVICE_NAME": "youtube"});ytcfg.set({bad json});</script>'
+            '<script>ytcfg.set({"INNERTUBE_API_KEY": "key"});var ytInitialData = {"a": "}"};</script>')
+    assert extract_bootstrap(chunked(html, 5)) == ({'INNERTUBE_API_KEY': 'key'}, {'a': '}'})
+
+
+def test_that_missing_objects_are_none():
+    assert extract_bootstrap(chunked('<html>ytcfg.set({"INNERTUBE_API_KEY": "key"</html>', 4)) == (None, None)
+    assert extract_bootstrap(['<script>window["ytInitialData"] = {"a": 1};</script>']) == (None, {'a': 1})
+
+
+def test_that_reading_stops_after_both_objects():
+    chunks = chunked(HTML.replace('</body>', '<div>%s</div></body>' % ('x' * 10000)), 1024)
+    iterator = iter(chunks)
+    extract_bootstrap(iterator)
+    assert 0 < len(list(iterator)) < len(chunks)
+
+
+def peak_memory(function, *args):
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize('method', ['regex', 'streaming'])
+def test_benchmark_bootstrap(benchmark, method):
+    benchmark.group = 'watch page bootstrap'
+    if method == 'regex':
+        function, argument = regex_bootstrap, HTML
+    else:
+        function, argument = (lambda chunks: extract_bootstrap(iter(chunks))), chunked(HTML, 65536)
+    benchmark.extra_info['peak_memory_kb'] = peak_memory(function, argument) // 1024
+    benchmark(function, argument)
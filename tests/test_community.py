@@ -0,0 +1,87 @@
+import csv
+import json
+
+import pytest
+
+from youtube_comment_downloader import main
+from youtube_comment_downloader.community import POST_FIELDS, extract_post
+
+from .benchmark import fake_youtube
+from .fake_youtube import FakeChannel, FakeYoutubeAdapter, fake_downloader
+from .pages import post_thread
+
+
+def community_downloader(channel):
+    adapter = FakeYoutubeAdapter(channels=[channel])
+    return fake_downloader(adapter), adapter
+
+
+def test_that_posts_are_extracted_with_their_attachments():
+    posts = [extract_post(post_thread('Ugkx%d' % index, index)['backstagePostThreadRenderer']['post']
+                          ['backstagePostRenderer']) for index in range(5)]
+    assert posts[0] == {'pid': 'Ugkx0', 'text': 'Post 0 with a link', 'time': '1 days ago', 'author': '@channel',
+                        'channel': 'UCuAXFkgsw1L7xaCfnd5JJOw', 'votes': '0', 'comment_count': '0',
+                        'attachments': []}
+    assert [[attachment['type'] for attachment in post['attachments']] for post in posts[1:]] == \
+        [['image'], ['image', 'image'], ['video'], ['poll']]
+    assert posts[1]['attachments'][0]['url'].endswith('=s1080')
+    assert posts[4]['attachments'][0] == {'type': 'poll', 'choices': ['Yes', 'No'], 'votes': '1.2K votes'}
+
+
+def test_that_all_pages_of_posts_are_yielded_in_order():
+    channel = FakeChannel(pages=3, per_page=4)
+    downloader, adapter = community_downloader(channel)
+    posts = list(downloader.get_community(channel.name))
+    assert [post['pid'] for post in posts] == channel.post_ids
+    assert all(list(post) == list(POST_FIELDS) for post in posts)
+    assert not any(path.startswith('/post/') for method, path in adapter.requests)
+
+
+def test_that_post_comments_are_fetched_for_every_post():
+    channel = FakeChannel(pages=2, per_page=3, comment_pages=2, comments_per_page=4)
+    downloader, adapter = community_downloader(channel)
+    posts = list(downloader.get_community(channel.name, comments=True, comment_workers=3, parse_time=False))
+    assert [post['pid'] for post in posts] == channel.post_ids
+    for post in posts:
+        top_level = [comment for comment in post['comments'] if not comment['reply']]
+        assert len(top_level) == 8 and top_level[0]['cid'].startswith('Ugz' + post['pid'][:6])
+        assert 'time_parsed' not in top_level[0]
+
+
+def test_that_a_failing_post_does_not_stop_the_download():
+    channel = FakeChannel(pages=2, per_page=3)
+    downloader, adapter = community_downloader(channel)
+    del adapter.videos[channel.post_ids[1]]  # Its comment pages now return an error
+    posts = list(downloader.get_community(channel.name, comments=True))
+    assert [post['pid'] for post in posts] == channel.post_ids
+    assert posts[1]['comments'] == [] and 'Video unavailable' in posts[1]['comments_error']
+    assert all(post['comments'] and 'comments_error' not in post for post in posts[:1] + posts[2:])
+
+
+def test_that_post_comments_can_be_limited():
+    channel = FakeChannel(pages=1, per_page=3, comment_pages=5)
+    downloader, adapter = community_downloader(channel)
+    posts = list(downloader.get_community(channel.name, comments=True, max_comments=2))
+    assert [len(post['comments']) for post in posts] == [2, 2, 2]
+    # Only the first comment page of every post was needed
+    assert sum(path == '/youtubei/v1/next' for method, path in adapter.requests) == 3
+
+
+def test_that_csv_output_stores_attachments_and_comments_as_json(tmp_path):
+    channel = FakeChannel(pages=2, per_page=3)
+    output = str(tmp_path / 'posts.csv')
+    with fake_youtube(FakeYoutubeAdapter(channels=[channel])):
+        main(['--community', channel.name, '--output', output, '--format', 'csv', '--post-comments',
+              '--max-comments-per-post', '3'])
+    with open(output, newline='') as fp:
+        rows = list(csv.DictReader(fp))
+    assert [row['pid'] for row in rows] == channel.post_ids
+    assert json.loads(rows[1]['attachments'])[0]['type'] == 'image'
+    assert len(json.loads(rows[0]['comments'])) == 3
+
+
+def test_that_community_posts_cannot_be_downloaded_incrementally(tmp_path, capsys):
+    with pytest.raises(SystemExit):
+        main(['--community', '@channel', '--output', str(tmp_path / 'posts.json'),
+              '--incremental', str(tmp_path / 'seen.sqlite')])
+    assert 'incremental' in capsys.readouterr().out
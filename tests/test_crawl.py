@@ -0,0 +1,191 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from youtube_comment_downloader.checkpoint import Checkpoint, count_lines
+from youtube_comment_downloader.incremental import SeenStore
+from youtube_comment_downloader.writers import open_writer
+
+from .pages import comment_page, continuation_endpoint, reply_page, token, untoken
+from .support import VIDEO_ID, PagedDownloader, crawl
+
+
+class GrowingDownloader(PagedDownloader):
+    # The same video a day later, with a new page of comments in front of the old ones
+
+    def ajax_request(self, endpoint, ytcfg, retries=5, sleep=20, timeout=60, pause=None):
+        kind, video_id, *rest = untoken(endpoint['continuationCommand']['token'])
+        if video_id != 'NewNewVideo':
+            return super().ajax_request(endpoint, ytcfg)
+        with self.lock:
+            self.requests += 1
+        page = json.dumps(comment_page(video_id, 0, pages=2) if kind == 'comments' else
+                          reply_page(video_id, rest[0], int(rest[1]), int(rest[2]), per_page=2))
+        return json.loads(page.replace(token('comments', video_id, 1), token('comments', VIDEO_ID, 0)))
+
+
+def test_that_replies_follow_their_thread():
+    comments = crawl(PagedDownloader(), executor=None, prefetched={})
+    seen = set()
+    for comment in comments:
+        if comment['reply']:
+            assert comment['cid'].split('.')[0] in seen
+        seen.add(comment['cid'])
+    assert len(seen) == len(comments)
+
+
+def test_that_concurrent_reply_fetching_keeps_the_serial_order():
+    serial = crawl(PagedDownloader(), executor=None, prefetched={})
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        concurrent = crawl(PagedDownloader(), executor=executor, prefetched={})
+    assert [c['cid'] for c in concurrent] == [c['cid'] for c in serial]
+    assert any(c['reply'] for c in serial)
+
+
+def test_that_concurrent_reply_fetching_overlaps_requests():
+    downloader = PagedDownloader(pages=1, latency=.02)
+    start = time.time()
+    crawl(downloader, executor=None, prefetched={})
+    serial_time = time.time() - start
+
+    downloader = PagedDownloader(pages=1, latency=.02)
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        crawl(downloader, executor=executor, prefetched={})
+    assert time.time() - start < serial_time / 2
+
+
+def test_that_an_interrupted_crawl_resumes_from_its_checkpoint_without_duplicates(tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    expected = [c['cid'] for c in crawl(PagedDownloader(), executor=None, prefetched={})]
+
+    checkpoint = Checkpoint(path, interval=0)
+    checkpoint.start('url', {}, continuation_endpoint(token('comments', VIDEO_ID, 0)))
+    comments = PagedDownloader().crawl_comments(list(checkpoint.state['continuations']), {}, None, 0, None, {},
+                                                checkpoint)
+    written = [c['cid'] for c in islice(comments, 37)]
+    comments.close()
+
+    checkpoint = Checkpoint(path)
+    assert checkpoint.resumes('url') and checkpoint.state['emitted'] <= 37
+    comments = PagedDownloader().crawl_comments(checkpoint.state['continuations'], {}, None, 0, None, {},
+                                                checkpoint, checkpoint.state['emitted'])
+    written += [c['cid'] for c in islice(comments, 37 - checkpoint.state['emitted'], None)]
+    assert written == expected
+    assert not os.path.exists(path)
+
+
+def test_that_a_checkpoint_is_only_saved_once_its_comments_are_on_disk(tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    output = str(tmp_path / 'comments.json')
+    saved = []
+
+    with open_writer(output) as writer:
+        def sync():
+            writer.sync()
+            saved.append((checkpoint.state['emitted'], count_lines(output)))
+
+        checkpoint = Checkpoint(path, interval=0, sync=sync)
+        checkpoint.start('url', {}, continuation_endpoint(token('comments', VIDEO_ID, 0)))
+        comments = PagedDownloader().crawl_comments(list(checkpoint.state['continuations']), {}, None, 0, None, {},
+                                                    checkpoint)
+        for comment in islice(comments, 37):
+            writer.write(comment)
+        comments.close()
+    assert len(saved) > 2 and all(emitted <= written for emitted, written in saved)
+
+
+def test_that_a_rejected_request_keeps_the_checkpoint(tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    downloader = PagedDownloader()
+    downloader.ajax_request = lambda endpoint, ytcfg, **kwargs: {}
+    checkpoint = Checkpoint(path)
+    checkpoint.start('url', {}, continuation_endpoint(token('comments', VIDEO_ID, 0)))
+    assert not list(downloader.crawl_comments(list(checkpoint.state['continuations']), {}, None, 0, None, {},
+                                              checkpoint))
+    assert Checkpoint(path).state['continuations'] == checkpoint.state['continuations']
+
+
+def test_that_partially_written_lines_are_dropped(tmp_path):
+    path = tmp_path / 'output.json'
+    path.write_bytes(b'{"cid": "a"}\n{"cid": "b"}\n{"ci')
+    assert count_lines(str(path)) == 2
+    assert path.read_bytes() == b'{"cid": "a"}\n{"cid": "b"}\n'
+
+
+def test_that_incremental_crawls_only_return_new_comments(tmp_path):
+    seen = SeenStore(str(tmp_path / 'seen.db'))
+    first = crawl(PagedDownloader(), executor=None, prefetched={}, seen=seen)
+    assert len(seen) == len(first)
+
+    downloader = GrowingDownloader()
+    second = crawl(downloader, start='NewNewVideo', executor=None, prefetched={}, seen=seen)
+    assert second and all(comment['cid'].startswith('UgzNewNew') for comment in second)
+    # The new page, its reply threads and the first old page, which ends the crawl
+    assert downloader.requests == 2 + sum(-(-int(c['replies'] or 0) // 2) for c in second if not c['reply'])
+    assert len(seen) == len(first) + len(second)
+    assert not crawl(GrowingDownloader(), start='NewNewVideo', executor=None, prefetched={}, seen=seen)
+
+
+def test_that_an_interrupted_incremental_crawl_does_not_hide_comments(tmp_path):
+    seen = SeenStore(str(tmp_path / 'seen.db'))
+    expected = crawl(PagedDownloader(), executor=None, prefetched={})
+    assert crawl(PagedDownloader(), executor=None, prefetched={}, seen=seen, max_requests=1)
+    comments = PagedDownloader().crawl_comments([continuation_endpoint(token('comments', VIDEO_ID, 0))], {}, None, 0,
+                                                None, {}, seen=seen)
+    assert list(islice(comments, 5))
+    comments.close()
+    assert len(seen) == 0
+    comments = crawl(PagedDownloader(), executor=None, prefetched={}, seen=seen)
+    assert [comment['cid'] for comment in comments] == [comment['cid'] for comment in expected]
+    assert len(seen) == len(expected)
+
+
+def replies_per_thread(comments):
+    counts = {}
+    for comment in comments:
+        if comment['reply']:
+            thread = comment['cid'].split('.')[0]
+            counts[thread] = counts.get(thread, 0) + 1
+    return counts
+
+
+def test_that_no_replies_skips_every_reply_request():
+    full = crawl(PagedDownloader(), executor=None, prefetched={})
+    downloader = PagedDownloader()
+    comments = crawl(downloader, executor=None, prefetched={}, max_replies=0)
+    assert comments == [comment for comment in full if not comment['reply']]
+    assert downloader.requests == 3
+    assert downloader.stats.avoided == sum(1 for comment in comments if comment['replies'])
+
+
+def test_that_replies_are_limited_per_thread():
+    full = crawl(PagedDownloader(), executor=None, prefetched={})
+    for max_replies in (1, 3):
+        downloader = PagedDownloader()
+        comments = crawl(downloader, executor=None, prefetched={}, max_replies=max_replies)
+        full_counts = replies_per_thread(full)
+        assert replies_per_thread(comments) == {thread: min(count, max_replies) for thread, count in full_counts.items()}
+        # Reply pages hold 2 replies, only the pages needed for the first replies are requested
+        assert downloader.requests == 3 + sum(-(-min(count, max_replies) // 2) for count in full_counts.values())
+        assert downloader.stats.avoided > 0
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        concurrent = crawl(PagedDownloader(), executor=executor, prefetched={}, max_replies=3)
+    assert concurrent == crawl(PagedDownloader(), executor=None, prefetched={}, max_replies=3)
+
+
+def test_that_the_request_budget_stops_the_crawl(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / 'checkpoint.json'))
+    checkpoint.start('url', {}, continuation_endpoint(token('comments', VIDEO_ID, 0)))
+    downloader = PagedDownloader()
+    comments = crawl(downloader, executor=None, prefetched={}, checkpoint=checkpoint, max_requests=2)
+    assert downloader.requests == 2 and comments
+    assert downloader.stats.avoided == len(checkpoint.state['continuations']) > 0
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        downloader = PagedDownloader()
+        crawl(downloader, executor=executor, prefetched={}, max_requests=5)
+    assert downloader.requests == 5
@@ -0,0 +1,86 @@
+import gzip
+import json
+import os
+
+from youtube_comment_downloader.debugarchive import DebugArchive, main, read_archive
+
+from .fake_youtube import FakeVideo, FakeYoutubeAdapter
+from .support import download
+
+VIDEO = FakeVideo(pages=3, filler=10000)
+
+
+def test_that_records_can_be_read_back_by_name_and_keys(tmp_path):
+    path = str(tmp_path / 'debug.jsonl.gz')
+    with DebugArchive(path) as archive:
+        archive.record('ytcfg', {'INNERTUBE_API_KEY': 'key'})
+        for page in range(3):
+            archive.record('continuationResponse', {'page': page}, page=page)
+            for item in range(2):
+                archive.record('actionItem', {'page': page, 'item': item}, page=page, action=0, item=item)
+
+    assert [record['seq'] for record in read_archive(path)] == list(range(10))
+    assert [record['data'] for record in read_archive(path, 'continuationResponse', page=1)] == [{'page': 1}]
+    assert [record['data'] for record in read_archive(path, page=2, item=1)] == [{'page': 2, 'item': 1}]
+    assert archive.stats()['records'] == 10 and archive.stats()['dropped'] == 0
+
+
+def test_that_pages_are_sampled_and_the_size_is_limited(tmp_path):
+    path = str(tmp_path / 'debug.jsonl.gz')
+    with DebugArchive(path, every=2, max_bytes=1000) as archive:
+        archive.record('ytcfg', {})
+        for page in range(10):
+            archive.record('continuationResponse', {'text': 'x' * 100}, page=page)
+
+    records = list(read_archive(path))
+    assert records[0]['name'] == 'ytcfg'
+    assert all(record['page'] % 2 == 0 for record in records[1:])
+    assert archive.bytes <= 1000 and archive.dropped == 5 - (len(records) - 1)
+
+
+def test_that_a_truncated_archive_is_read_up_to_the_break(tmp_path):
+    path = str(tmp_path / 'debug.jsonl.gz')
+    with gzip.open(path, 'wt') as fp:
+        fp.write(''.join(json.dumps({'seq': seq, 'name': 'item', 'data': 'x' * 1000}) + '\n' for seq in range(100)))
+    with open(path, 'rb') as fp:
+        data = fp.read()
+    with open(path, 'wb') as fp:
+        fp.write(data[:len(data) // 2])
+    assert 0 < len(list(read_archive(path))) < 100
+
+
+def test_that_a_debug_download_writes_a_single_archive(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    download(FakeYoutubeAdapter([VIDEO]), tmp_path, '--debug')
+    archives = os.listdir(tmp_path / 'debug' / VIDEO.video_id)
+    assert len(archives) == 1
+    path = str(tmp_path / 'debug' / VIDEO.video_id / archives[0])
+
+    assert next(read_archive(path, 'ytResponse.html'))['data'] == VIDEO.watch_html()
+    first_page = next(read_archive(path, 'continuationResponse', page=0))['data']
+    assert first_page == json.loads(VIDEO.comments_page(0))
+
+    capsys.readouterr()
+    main([path, '--name', 'actionItem', '--page', '0', '--item', '0', '--data'])
+    items = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert len(items) == 1 and 'commentThreadRenderer' in items[0]
+
+
+def test_that_records_keep_the_data_as_it_was_when_captured(tmp_path):
+    path = str(tmp_path / 'debug.jsonl.gz')
+    ytcfg = {'INNERTUBE_CONTEXT': {'client': {'hl': 'en'}}}
+    with DebugArchive(path) as archive:
+        archive.record('ytcfg', ytcfg)
+        ytcfg['INNERTUBE_CONTEXT']['client']['hl'] = 'nl'
+    assert next(read_archive(path, 'ytcfg'))['data']['INNERTUBE_CONTEXT']['client']['hl'] == 'en'
+
+
+def test_that_the_queue_is_bounded_by_bytes(tmp_path):
+    path = str(tmp_path / 'debug.jsonl.gz')
+    archive = DebugArchive(path, queue_bytes=1000)
+    archive.queue.put(None)  # Stop the writer, so that nothing leaves the queue
+    archive.thread.join()
+    for page in range(10):
+        archive.record('continuationResponse', {'text': 'x' * 100}, page=page)
+    assert archive.queued <= 1000 and archive.dropped > 0 and archive.queue.qsize() == 10 - archive.dropped
+    archive.close()
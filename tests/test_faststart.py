@@ -0,0 +1,73 @@
+import base64
+import json
+import time
+
+from youtube_comment_downloader.faststart import YtcfgCache, comment_endpoint, comment_token, url_video_id
+
+from . import pages
+from .fake_youtube import API_KEY, FakeVideo, FakeYoutubeAdapter
+from .support import download, without_time
+
+VIDEO = FakeVideo(pages=3, filler=10000)
+
+
+def test_that_the_comment_token_is_a_protobuf_message():
+    message = pages.decode_message(base64.urlsafe_b64decode(comment_token('dQw4w9WgXcQ', 1)))
+    assert pages.decode_message(message[2][0]) == {2: [b'dQw4w9WgXcQ']}
+    assert message[3] == [6]
+    params = pages.decode_message(message[6][0])
+    assert params[8] == [b'comments-section']
+    assert pages.decode_message(params[4][0]) == {4: [b'dQw4w9WgXcQ'], 6: [1]}
+    assert comment_endpoint('dQw4w9WgXcQ', 0)['continuationCommand']['token'] == comment_token('dQw4w9WgXcQ', 0)
+
+
+def test_that_video_ids_are_found_in_urls():
+    assert url_video_id('https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=1') == 'dQw4w9WgXcQ'
+    assert url_video_id('https://youtu.be/dQw4w9WgXcQ') == 'dQw4w9WgXcQ'
+    assert url_video_id('https://www.youtube.com/@someone/community') is None
+
+
+def test_that_the_cache_expires(tmp_path):
+    path = str(tmp_path / 'ytcfg.json')
+    cache = YtcfgCache(path, ttl=60)
+    assert cache.get() is None
+    cache.put({'INNERTUBE_API_KEY': API_KEY, 'INNERTUBE_CONTEXT': {'client': {'hl': 'en'}}, 'EXPERIMENT_FLAGS': {}})
+
+    ytcfg = YtcfgCache(path, ttl=60).get('de')
+    assert ytcfg == {'INNERTUBE_API_KEY': API_KEY, 'INNERTUBE_CONTEXT': {'client': {'hl': 'de'}}}
+    assert cache.get()['INNERTUBE_CONTEXT']['client']['hl'] == 'en'
+
+    cache.state['saved'] = time.time() - 61
+    assert cache.get() is None
+
+
+def test_that_a_corrupt_cache_is_ignored(tmp_path):
+    path = tmp_path / 'ytcfg.json'
+    path.write_text('{"saved": ')
+    assert YtcfgCache(str(path)).get() is None
+
+
+def test_that_a_cached_ytcfg_skips_the_watch_page(tmp_path):
+    cache = str(tmp_path / 'ytcfg.json')
+    adapter = FakeYoutubeAdapter([VIDEO])
+    expected = without_time(download(adapter, tmp_path))
+    html_requests = adapter.requests
+
+    adapter = FakeYoutubeAdapter([VIDEO])
+    assert without_time(download(adapter, tmp_path, '--fast-start', cache)) == expected
+    assert adapter.requests == html_requests
+    with open(cache) as fp:
+        assert json.load(fp)['ytcfg']['INNERTUBE_API_KEY'] == API_KEY
+
+    adapter = FakeYoutubeAdapter([VIDEO])
+    assert without_time(download(adapter, tmp_path, '--fast-start', cache)) == expected
+    assert adapter.requests == html_requests[1:]
+
+
+def test_that_a_rejected_token_falls_back_to_the_watch_page(tmp_path):
+    cache = str(tmp_path / 'ytcfg.json')
+    expected = without_time(download(FakeYoutubeAdapter([VIDEO]), tmp_path, '--fast-start', cache))
+
+    adapter = FakeYoutubeAdapter([VIDEO], fast_start=False)
+    assert without_time(download(adapter, tmp_path, '--fast-start', cache)) == expected
+    assert adapter.requests[:2] == [('POST', '/youtubei/v1/next'), ('GET', '/watch')]
@@ -0,0 +1,63 @@
+from youtube_comment_downloader.pacing import RateLimiter, parse_retry_after
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def limiter(**kwargs):
+    clock = Clock()
+    return RateLimiter(clock=clock, sleep=clock.sleep, **kwargs), clock
+
+
+def test_that_requests_are_paced_once_the_burst_is_used():
+    rate_limiter, clock = limiter(rate=10, burst=2)
+    waits = [rate_limiter.acquire() for _ in range(4)]
+    assert waits[:2] == [0, 0]
+    assert abs(clock.now - 1000.2) < 1e-9
+
+
+def test_that_throttling_halves_the_rate_and_success_raises_it_again():
+    rate_limiter, clock = limiter(rate=10, max_rate=20, window=4)
+    rate_limiter.failure(0, throttled=True)
+    assert rate_limiter.rate == 5
+    for _ in range(4):
+        rate_limiter.success()
+    assert rate_limiter.rate > 5
+
+
+def test_that_retry_after_pauses_all_requests():
+    rate_limiter, clock = limiter()
+    assert rate_limiter.failure(0, retry_after='7') == 7
+    rate_limiter.acquire()
+    assert clock.now >= 1007
+
+
+def test_that_backoff_grows_exponentially_with_jitter():
+    rate_limiter, clock = limiter(backoff=2, jitter=.5, max_backoff=10)
+    assert 1 <= rate_limiter.failure(0) <= 2
+    assert 4 <= rate_limiter.failure(2) <= 8
+    assert 5 <= rate_limiter.failure(8) <= 10
+
+
+def test_that_counters_are_reported():
+    rate_limiter, clock = limiter(rate=10, burst=1)
+    rate_limiter.acquire()
+    rate_limiter.acquire()
+    rate_limiter.failure(0, retry_after='1', throttled=False)
+    stats = rate_limiter.stats()
+    assert stats['requests'] == 2 and stats['retries'] == 1 and stats['throttled'] == 0
+    assert stats['wait_time'] == 0.1 and stats['requests_per_second'] == 20
+
+
+def test_that_retry_after_dates_are_parsed():
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT', now=1445412470) == 10
+    assert parse_retry_after('soon') is None
@@ -0,0 +1,75 @@
+import json
+import os
+
+import pytest
+
+from .benchmark import SIZES, run_pipeline
+from .fake_youtube import FakeVideo, FakeYoutubeAdapter
+from .support import download, without_time
+
+VIDEO = FakeVideo(pages=4, filler=10000)
+
+
+def test_that_comments_are_downloaded_through_the_consent_page(tmp_path):
+    adapter = FakeYoutubeAdapter([VIDEO], consent=True)
+    comments = download(adapter, tmp_path)
+    assert [request for request in adapter.requests[:4]] == [('GET', '/watch'), ('GET', '/m'), ('POST', '/save'),
+                                                             ('GET', '/watch')]
+    assert sum(not comment['reply'] for comment in comments) == 4 * VIDEO.per_page
+    assert any(comment['reply'] for comment in comments)
+    assert any('paid' in comment for comment in comments)
+    assert all('time_parsed' in comment for comment in comments)
+
+
+def test_that_throttled_requests_are_retried(tmp_path):
+    expected = without_time(download(FakeYoutubeAdapter([VIDEO]), tmp_path))
+    assert without_time(download(FakeYoutubeAdapter([VIDEO], throttle_every=5), tmp_path)) == expected
+
+
+def test_that_a_rejected_download_resumes_from_its_checkpoint(tmp_path):
+    checkpoint = str(tmp_path / 'checkpoint.json')
+    expected = without_time(download(FakeYoutubeAdapter([VIDEO]), tmp_path))
+
+    partial = download(FakeYoutubeAdapter([VIDEO], reject_at=20), tmp_path, '--checkpoint', checkpoint)
+    assert 0 < len(partial) < len(expected) and os.path.exists(checkpoint)
+
+    adapter = FakeYoutubeAdapter([VIDEO])
+    assert without_time(download(adapter, tmp_path, '--checkpoint', checkpoint)) == expected
+    assert ('GET', '/watch') not in adapter.requests
+    assert not os.path.exists(checkpoint)
+
+
+def test_that_a_checkpoint_ahead_of_the_output_starts_over(tmp_path):
+    checkpoint = str(tmp_path / 'checkpoint.json')
+    expected = without_time(download(FakeYoutubeAdapter([VIDEO]), tmp_path))
+
+    partial = download(FakeYoutubeAdapter([VIDEO], reject_at=20), tmp_path, '--checkpoint', checkpoint)
+    with open(checkpoint) as fp:
+        assert 0 < json.load(fp)['emitted'] <= len(partial)
+    # Lose the last comments, as if they had never reached the disk
+    with open(str(tmp_path / 'comments.json'), 'r+') as fp:
+        fp.truncate(len(''.join(fp.readlines()[:1])))
+
+    adapter = FakeYoutubeAdapter([VIDEO])
+    assert without_time(download(adapter, tmp_path, '--checkpoint', checkpoint)) == expected
+    assert ('GET', '/watch') in adapter.requests
+
+
+def test_that_a_limited_incremental_download_does_not_hide_comments(tmp_path):
+    seen = str(tmp_path / 'seen.db')
+    expected = without_time(download(FakeYoutubeAdapter([VIDEO]), tmp_path))
+    assert len(download(FakeYoutubeAdapter([VIDEO]), tmp_path, '--incremental', seen, '--limit', '5')) == 5
+    assert without_time(download(FakeYoutubeAdapter([VIDEO]), tmp_path, '--incremental', seen)) == expected
+    assert download(FakeYoutubeAdapter([VIDEO]), tmp_path, '--incremental', seen) == []
+
+
+@pytest.mark.parametrize('size', sorted(SIZES, key=SIZES.get))
+def test_benchmark_pipeline(benchmark, size):
+    # Only the 1k video runs by default, set BENCHMARK_SIZES=1k,100k,1M to run the larger ones
+    if size not in os.environ.get('BENCHMARK_SIZES', '1k').split(','):
+        pytest.skip('set BENCHMARK_SIZES to run the %s comments benchmark' % size)
+    video = FakeVideo.with_comments(SIZES[size], replies=0)
+    benchmark.group = 'pipeline'
+    report = benchmark.pedantic(run_pipeline, args=(video,), rounds=3 if SIZES[size] <= 1000 else 1)
+    benchmark.extra_info.update(report)
+    assert report['comments'] == SIZES[size]
@@ -0,0 +1,99 @@
+import csv
+
+import pytest
+
+from youtube_comment_downloader import main
+from youtube_comment_downloader.downloader import COMMENT_PAGE_KEYS
+from youtube_comment_downloader.incremental import SeenStore
+from youtube_comment_downloader.record import Comment, check_fields, parse_count
+from youtube_comment_downloader.timeparse import TimeParser
+
+from .benchmark import fake_youtube
+from .fake_youtube import FakeVideo, FakeYoutubeAdapter
+from .pages import comment_page
+from .support import PagedDownloader, crawl, without_time
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('0', 0), ('', 0), ('12', 12), ('1,234', 1234), ('1.2K', 1200), ('3M', 3000000), ('1,5K', 1500), ('abc', None),
+])
+def test_that_counts_are_parsed(text, expected):
+    assert parse_count(text) == expected
+
+
+def test_that_fields_are_checked():
+    assert check_fields('cid, text,votes') == ('cid', 'text', 'votes')
+    assert check_fields(None) is None
+    with pytest.raises(ValueError):
+        check_fields(['cid', 'likes'])
+
+
+def test_that_projected_comments_only_have_the_requested_fields():
+    full = crawl(PagedDownloader(), executor=None, prefetched={}, parse_time=False)
+    projected = crawl(PagedDownloader(), executor=None, prefetched={}, fields=('votes', 'cid', 'paid'))
+    assert projected == [{key: comment[key] for key in ('votes', 'cid', 'paid') if key in comment} for comment in full]
+    assert list(projected[0]) == ['votes', 'cid']
+
+
+def test_that_compact_comments_convert_to_the_usual_dicts():
+    full = crawl(PagedDownloader(), executor=None, prefetched={})
+    compact = crawl(PagedDownloader(), executor=None, prefetched={}, compact=True)
+    assert all(isinstance(comment, Comment) for comment in compact)
+    assert without_time([comment.to_dict() for comment in compact]) == without_time(full)
+    assert compact[0]['cid'] == compact[0].cid and compact[0].get('paid', 'none') == full[0].get('paid', 'none')
+    assert compact[0].vote_count == parse_count(full[0]['votes'])
+
+
+def test_that_compact_comments_parse_their_time_lazily():
+    comment = Comment(cid='Ugx', time='3 days ago', time_parser=TimeParser('en'), reference=1000000)
+    assert not hasattr(comment, 'parsed_time')
+    assert comment.time_parsed == 1000000 - 3 * 24 * 3600
+    assert 'text' not in comment and comment.to_dict() == {'cid': 'Ugx', 'time': '3 days ago',
+                                                           'time_parsed': 1000000 - 3 * 24 * 3600}
+    with pytest.raises(KeyError):
+        comment['text']
+
+
+def test_that_compact_comments_parse_their_time_without_the_time_field():
+    downloader = PagedDownloader()
+    index = downloader.index_dict(comment_page('dQw4w9WgXcQ', 0, per_page=10, pages=1), COMMENT_PAGE_KEYS)
+    time_parser = TimeParser('en')
+    fields = ('cid', 'time_parsed')
+    compact = [comment.to_dict() for comment in downloader.extract_fields(index, time_parser, fields, compact=True)]
+    full = downloader.extract_fields(index, time_parser, fields)
+    assert [list(comment) for comment in compact] == [list(comment) for comment in full] == [list(fields)] * 10
+    assert all(abs(a['time_parsed'] - b['time_parsed']) < 1 for a, b in zip(compact, full))
+
+
+def test_that_incremental_projections_still_work(tmp_path):
+    seen = SeenStore(str(tmp_path / 'seen.db'))
+    first = crawl(PagedDownloader(), executor=None, prefetched={}, seen=seen, fields=('text',))
+    assert first and all(list(comment) == ['text'] for comment in first)
+    assert not crawl(PagedDownloader(), executor=None, prefetched={}, seen=seen, fields=('text',))
+
+
+def test_that_csv_output_has_the_requested_columns(tmp_path):
+    video = FakeVideo(pages=2, filler=10000)
+    output = str(tmp_path / 'comments.csv')
+    with fake_youtube(FakeYoutubeAdapter([video])):
+        main(['--youtubeid', video.video_id, '--output', output, '--fields', 'cid,votes', '--format', 'csv'])
+    with open(output, newline='') as fp:
+        rows = list(csv.reader(fp))
+    assert rows[0] == ['cid', 'votes'] and len(rows) > 2 and all(len(row) == 2 for row in rows)
+
+
+def test_that_time_parsed_cannot_be_requested_without_time_parsing(tmp_path, capsys):
+    with pytest.raises(SystemExit):
+        main(['--youtubeid', 'dQw4w9WgXcQ', '--output', str(tmp_path / 'comments.json'), '--fields', 'time_parsed',
+              '--no-time-parsed'])
+    assert 'time_parsed' in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('kind, kwargs', [('dict', {}), ('fields', {'fields': ('cid', 'text', 'votes')}),
+                                          ('compact', {'compact': True})])
+def test_benchmark_extraction(benchmark, kind, kwargs):
+    downloader = PagedDownloader()
+    index = downloader.index_dict(comment_page('dQw4w9WgXcQ', 0, per_page=100, pages=1), COMMENT_PAGE_KEYS)
+    time_parser = TimeParser('en')
+    benchmark.group = 'comment extraction'
+    benchmark(downloader.extract_comments, index, time_parser, **kwargs)
@@ -0,0 +1,94 @@
+import pytest
+
+from youtube_comment_downloader import main
+from youtube_comment_downloader.responsecache import ResponseCache
+
+from .benchmark import fake_youtube
+from .fake_youtube import FakeChannel, FakeVideo, FakeYoutubeAdapter, fake_downloader
+
+
+def test_that_a_second_download_is_served_from_the_cache(tmp_path):
+    video = FakeVideo(pages=3, filler=10000)
+    with ResponseCache(str(tmp_path / 'cache.sqlite')) as cache:
+        adapter = FakeYoutubeAdapter([video])
+        first = list(fake_downloader(adapter, cache).get_comments(video.video_id, parse_time=False))
+        requests = len(adapter.requests)
+        second = list(fake_downloader(adapter, cache).get_comments(video.video_id, parse_time=False))
+        assert first == second and len(adapter.requests) == requests
+        assert cache.stats()['hits'] == requests
+
+
+def test_that_the_language_is_part_of_the_key():
+    context = {'client': {'hl': 'en', 'gl': 'US', 'clientVersion': '2.20240101.00.00'}}
+    other = {'client': {'hl': 'nl', 'gl': 'US', 'clientVersion': '2.20240101.00.00'}}
+    newer = {'client': {'hl': 'en', 'gl': 'US', 'clientVersion': '2.20250101.00.00'}}
+    key = ResponseCache.key('https://www.youtube.com/youtubei/v1/next', 'token', context)
+    assert key != ResponseCache.key('https://www.youtube.com/youtubei/v1/next', 'token', other)
+    assert key == ResponseCache.key('https://www.youtube.com/youtubei/v1/next', 'token', newer)
+
+
+def test_that_expired_entries_are_not_used(tmp_path, monkeypatch):
+    with ResponseCache(str(tmp_path / 'cache.sqlite'), ttl=60) as cache:
+        cache.put('key', b'data')
+        assert cache.get('key') == b'data'
+        monkeypatch.setattr('time.time', lambda: 1e12)
+        assert cache.get('key') is None
+
+
+def test_that_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    clock = iter(range(1000))
+    monkeypatch.setattr('time.time', lambda: next(clock))
+    data = bytes(range(256)) * 40  # Hardly compressible, ~10kB per entry
+    with ResponseCache(str(tmp_path / 'cache.sqlite'), max_bytes=35000, level=0) as cache:
+        for key in 'abc':
+            cache.put(key, data)
+        cache.get('a')
+        cache.put('d', data)
+        assert [cache.get(key) is not None for key in 'abcd'] == [True, False, True, True]
+        assert cache.stats()['evicted'] == 1 and cache.stats()['bytes'] <= 35000
+
+
+def test_that_offline_mode_does_not_download(tmp_path):
+    channel = FakeChannel(pages=2, per_page=3)
+    path = str(tmp_path / 'cache.sqlite')
+    with ResponseCache(path) as cache:
+        online = list(fake_downloader(FakeYoutubeAdapter(channels=[channel]), cache).get_community(channel.name))
+
+    adapter = FakeYoutubeAdapter()
+    with ResponseCache(path, offline=True) as cache:
+        offline = list(fake_downloader(adapter, cache).get_community(channel.name))
+        assert offline == online and not adapter.requests
+        with pytest.raises(RuntimeError):
+            list(fake_downloader(adapter, cache).get_community('@other'))
+
+
+def test_that_the_cache_can_be_used_from_the_command_line(tmp_path):
+    video = FakeVideo(pages=2, filler=10000)
+    cache = str(tmp_path / 'cache.sqlite')
+    for index, options in enumerate([[], ['--offline']]):
+        with fake_youtube(FakeYoutubeAdapter([video] if not options else [])):
+            main(['--youtubeid', video.video_id, '--output', str(tmp_path / ('%d.json' % index)),
+                  '--cache', cache, '--no-time-parsed'] + options)
+    assert (tmp_path / '0.json').read_text() == (tmp_path / '1.json').read_text()
+
+
+def test_that_cached_pages_are_not_paced(tmp_path, monkeypatch):
+    video = FakeVideo(pages=3, filler=10000)
+    sleeps = []
+    monkeypatch.setattr('youtube_comment_downloader.downloader.time.sleep', sleeps.append)
+    with ResponseCache(str(tmp_path / 'cache.sqlite')) as cache:
+        adapter = FakeYoutubeAdapter([video])
+        list(fake_downloader(adapter, cache).get_comments(video.video_id, sleep=.5))
+        assert sleeps and set(sleeps) == {.5}
+        del sleeps[:]
+        list(fake_downloader(adapter, cache).get_comments(video.video_id, sleep=.5))
+        assert not sleeps
+
+
+def test_that_error_responses_are_not_cached(tmp_path):
+    video = FakeVideo(pages=1, filler=1000)
+    with ResponseCache(str(tmp_path / 'cache.sqlite')) as cache:
+        downloader = fake_downloader(FakeYoutubeAdapter(), cache)
+        response = downloader.ajax_request(video.endpoint(1), {'INNERTUBE_API_KEY': 'key', 'INNERTUBE_CONTEXT': {
+            'client': {'hl': 'en'}}})
+        assert 'externalErrorMessage' in str(response) and len(cache) == 0
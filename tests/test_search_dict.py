@@ -1,4 +1,11 @@
-from downloader import search_dict
+import pytest
+
+from youtube_comment_downloader.downloader import YoutubeCommentDownloader, COMMENT_PAGE_KEYS
+
+from .pages import comment_page, reply_page
+
+search_dict = YoutubeCommentDownloader.search_dict
+index_dict = YoutubeCommentDownloader.index_dict
 
 
 def test_that_nothing_is_yielded_from_empty_dict():
@@ -29,6 +36,50 @@ def test_that_expected_value_is_yielded_when_nesting_dictionaries():
     )
 
 
+def test_that_index_dict_matches_search_dict_for_every_key():
+    test_dict = {"a": {"b": {"a": 1}, "c": [{"b": 2}, {"a": 3}]}, "b": {"c": 4}}
+    index = index_dict(test_dict, ["a", "b", "c"])
+    assert index == {key: list(search_dict(test_dict, key)) for key in "abc"}
+
+
+def test_that_index_dict_does_not_descend_into_matched_values_for_the_same_key():
+    assert index_dict({"test": {"test": "nested"}}, ["test"]) == {"test": [{"test": "nested"}]}
+
+
+def test_that_index_dict_has_a_bucket_for_missing_keys():
+    assert index_dict({}, ["test"]) == {"test": []}
+
+
+def test_that_index_dict_matches_search_dict_on_comment_pages():
+    for page in (comment_page("dQw4w9WgXcQ", 0, paid_every=3), reply_page("dQw4w9WgXcQ", "Ugz", 25, 0)):
+        index = index_dict(page, COMMENT_PAGE_KEYS)
+        assert index == {key: list(search_dict(page, key)) for key in COMMENT_PAGE_KEYS}
+
+
 def test_benchmark_search(benchmark):
     test_dict = {index: list(range(10)) for index in range(1, 30)}
     benchmark(lambda: list(search_dict(test_dict, "test")))
+
+
+PAGES = {
+    "comments": [comment_page("dQw4w9WgXcQ", page, paid_every=5) for page in range(5)],
+    "replies": [reply_page("dQw4w9WgXcQ", "Ugz%d" % page, 50, 0) for page in range(5)],
+}
+
+
+def search_page_per_key(pages):
+    for page in pages:
+        for key in COMMENT_PAGE_KEYS:
+            list(search_dict(page, key))
+
+
+def index_page(pages):
+    for page in pages:
+        index_dict(page, COMMENT_PAGE_KEYS)
+
+
+@pytest.mark.parametrize("kind", sorted(PAGES))
+@pytest.mark.parametrize("walk", [search_page_per_key, index_page], ids=["search_dict", "index_dict"])
+def test_benchmark_page_walk(benchmark, kind, walk):
+    benchmark.group = "page walk: " + kind
+    benchmark(walk, PAGES[kind])
@@ -0,0 +1,66 @@
+import json
+import os
+
+from youtube_comment_downloader.stats import DownloadStats, PageProfiler, percentile
+
+from .fake_youtube import FakeVideo, FakeYoutubeAdapter
+from .support import download
+
+VIDEO = FakeVideo(pages=3, filler=10000)
+
+
+def test_that_requests_and_pages_are_summarized():
+    events = []
+    stats = DownloadStats(callback=lambda event, data: events.append(event))
+    stats.request(200, .1, 1000)
+    stats.request(429, .3, 0)
+    stats.request(200, .2, 500, attempt=1)
+    stats.page(20, .01)
+    stats.page(10, .01)
+    stats.add('output', .5)
+
+    summary = stats.summary()
+    assert summary['requests'] == 3 and summary['retries'] == 1 and summary['bytes'] == 1500
+    assert summary['statuses'] == {'200': 2, '429': 1}
+    assert summary['latency']['p50'] == .2 and summary['latency']['max'] == .3
+    assert summary['pages'] == 2 and summary['comments_per_page'] == 15
+    assert summary['stages']['request'] == .6 and summary['stages']['output'] == .5
+    assert events == ['request', 'request', 'request', 'page', 'page']
+    assert '3 request(s)' in DownloadStats.format(summary)
+
+
+def test_that_time_parsing_is_not_counted_twice():
+    events = []
+    stats = DownloadStats(callback=lambda event, data: events.append(data))
+    stats.add('extract', 1.0)
+    stats.add('time_parse', .25)
+    stats.page(20, 1.5)
+    assert stats.summary()['stages']['extract'] == .75 and stats.summary()['stages']['time_parse'] == .25
+    assert events == [{'page': 0, 'comments': 20, 'page_time': 1.5}]
+
+
+def test_that_percentiles_handle_empty_lists():
+    assert percentile([], .95) == 0.0
+    assert percentile([3, 1, 2], .95) == 3
+
+
+def test_that_the_profiler_stops_after_its_pages(tmp_path):
+    path = str(tmp_path / 'profile.prof')
+    stats = DownloadStats(profiler=PageProfiler(path, pages=2))
+    stats.page(20, .01)
+    assert not os.path.exists(path)
+    stats.page(20, .01)
+    assert os.path.exists(path) and os.path.exists(path + '.txt')
+
+
+def test_that_stats_are_written_as_json(tmp_path):
+    path = str(tmp_path / 'stats.json')
+    adapter = FakeYoutubeAdapter([VIDEO])
+    comments = download(adapter, tmp_path, '--stats', path, '--profile', '2', '--profile-type', 'memory')
+    with open(path) as fp:
+        summary = json.load(fp)
+    assert summary['requests'] == len([request for request in adapter.requests if request[0] == 'POST'])
+    assert summary['comments'] == len(comments)
+    assert summary['stages']['bootstrap'] > 0 and summary['stages']['output'] > 0
+    assert summary['rate_limiter']['requests'] == len(adapter.requests)
+    assert os.path.exists(str(tmp_path / 'comments.json.memory.txt'))
@@ -0,0 +1,50 @@
+import datetime
+import sys
+
+import pytest
+
+from youtube_comment_downloader.timeparse import TimeParser, parse_relative_time
+
+REFERENCE = datetime.datetime(2024, 3, 31, 12, 0, 0).timestamp()
+
+
+@pytest.mark.parametrize('text, language, expected', [
+    ('3 days ago', None, datetime.datetime(2024, 3, 28, 12)),
+    ('1 week ago', 'en', datetime.datetime(2024, 3, 24, 12)),
+    ('an hour ago', None, datetime.datetime(2024, 3, 31, 11)),
+    ('1 month ago', None, datetime.datetime(2024, 2, 29, 12)),
+    ('2 years ago', None, datetime.datetime(2022, 3, 31, 12)),
+    ('vor 3 Tagen', 'de', datetime.datetime(2024, 3, 28, 12)),
+    ('il y a 2 mois', 'fr', datetime.datetime(2024, 1, 31, 12)),
+    ('hace 1 año', 'es-419', datetime.datetime(2023, 3, 31, 12)),
+    ('3 days ago', 'de', datetime.datetime(2024, 3, 28, 12)),
+])
+def test_that_relative_times_are_resolved_without_dateparser(text, language, expected):
+    assert parse_relative_time(text, language, REFERENCE) == expected.timestamp()
+
+
+def test_that_the_edited_suffix_is_ignored():
+    assert TimeParser().parse('2 weeks ago (edited)', REFERENCE) == datetime.datetime(2024, 3, 17, 12).timestamp()
+
+
+def test_that_unknown_phrases_fall_back_to_dateparser():
+    assert parse_relative_time('yesterday', None, REFERENCE) is None
+    assert TimeParser().parse('yesterday', REFERENCE) == datetime.datetime(2024, 3, 30, 12).timestamp()
+
+
+def test_that_dateparser_is_not_imported_up_front():
+    sys.modules.pop('dateparser', None)
+    TimeParser().parse('5 minutes ago')
+    assert 'dateparser' not in sys.modules
+
+
+@pytest.mark.parametrize('parser', ['dateparser', 'TimeParser'])
+def test_benchmark_time_parsing(benchmark, parser):
+    import dateparser
+    texts = ['%d %s ago' % (n, unit) for n in range(1, 12) for unit in ('hours', 'days', 'weeks', 'months')]
+    if parser == 'dateparser':
+        parse = lambda text: dateparser.parse(text)
+    else:
+        parse = TimeParser().parse
+    benchmark.group = 'time parsing'
+    benchmark(lambda: [parse(text) for text in texts])
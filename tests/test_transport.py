@@ -0,0 +1,34 @@
+import json
+
+from youtube_comment_downloader.transport import ACCEPT_ENCODING, Transport
+
+from .fake_youtube import FakeVideo, FakeYoutubeAdapter, fake_downloader
+
+
+def test_that_the_pool_is_sized_for_concurrent_requests():
+    transport = Transport(pool_maxsize=64)
+    adapter = transport.session.get_adapter('https://www.youtube.com/youtubei/v1/next')
+    assert adapter._pool_maxsize == 64
+    assert transport.session.headers['Accept-Encoding'] == ACCEPT_ENCODING
+
+
+def test_that_compressed_responses_are_counted():
+    video = FakeVideo(pages=3, filler=10000)
+    adapter = FakeYoutubeAdapter([video], compress=True)
+    downloader = fake_downloader(adapter)
+    comments = list(downloader.get_comments(video.video_id))
+    stats = downloader.transport.stats()
+    assert comments and stats['responses'] == len(adapter.requests)
+    assert 0 < stats['wire_bytes'] and stats['compression_ratio'] > 2
+    assert stats['body_bytes'] == downloader.stats.summary()['bytes']
+    assert stats['decode_seconds'] > 0
+
+
+def test_that_both_json_decoders_give_the_same_comments():
+    video = FakeVideo(pages=2, filler=10000)
+    results = []
+    for fast_json in (True, False):
+        downloader = fake_downloader(FakeYoutubeAdapter([video]), fast_json=fast_json)
+        results.append(json.dumps(list(downloader.get_comments(video.video_id, parse_time=False))))
+    assert downloader.transport.stats()['json'] == 'json'
+    assert results[0] == results[1]
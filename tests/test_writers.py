@@ -0,0 +1,89 @@
+import csv
+import gzip
+import json
+import sqlite3
+
+import pytest
+
+from youtube_comment_downloader.record import Comment
+from youtube_comment_downloader.writers import open_writer, to_json
+
+COMMENTS = [{'cid': 'Ugz1', 'text': 'Eerste reactie ✓', 'votes': '1.2K', 'heart': True, 'reply': False},
+            {'cid': 'Ugz1.A', 'text': 'Reply, with "quotes"', 'votes': '0', 'heart': False, 'reply': True}]
+
+
+def write(path, comments=COMMENTS, **kwargs):
+    with open_writer(str(path), batch_size=1, **kwargs) as writer:
+        for comment in comments:
+            writer.write(comment)
+
+
+@pytest.mark.parametrize('fast', [True, False])
+def test_that_ndjson_has_one_comment_per_line(tmp_path, fast, monkeypatch):
+    if not fast:
+        monkeypatch.setattr('youtube_comment_downloader.writers.orjson', None)
+    write(tmp_path / 'comments.json')
+    lines = (tmp_path / 'comments.json').read_text(encoding='utf8').splitlines()
+    assert [json.loads(line) for line in lines] == COMMENTS
+
+
+@pytest.mark.parametrize('comments', [COMMENTS, []])
+def test_that_pretty_json_is_a_single_document(tmp_path, comments):
+    write(tmp_path / 'comments.json', comments, pretty=True)
+    text = (tmp_path / 'comments.json').read_text(encoding='utf8')
+    assert json.loads(text) == {'comments': comments}
+    if comments:
+        assert text == '{\n    "comments": [\n' + ',\n'.join(to_json(c, indent=4) for c in comments) + '\n    ]\n}'
+
+
+def test_that_pretty_json_indents_every_line_once(tmp_path):
+    comment = {'cid': 'a', 'text': 'line\nbreak\u2028separator'}
+    assert to_json(comment, indent=2) == '    {\n      "cid": "a",\n      "text": "line\\nbreak\u2028separator"\n    }'
+    write(tmp_path / 'comments.json', [comment], pretty=True)
+    assert json.loads((tmp_path / 'comments.json').read_text(encoding='utf8')) == {'comments': [comment]}
+
+
+def test_that_csv_has_a_column_per_field(tmp_path):
+    write(tmp_path / 'comments.csv', format='csv')
+    with open(str(tmp_path / 'comments.csv'), encoding='utf8') as fp:
+        rows = list(csv.DictReader(fp))
+    assert [row['text'] for row in rows] == [comment['text'] for comment in COMMENTS]
+    assert rows[0]['votes'] == '1.2K' and rows[0]['paid'] == ''
+
+
+def test_that_sqlite_stores_a_row_per_comment(tmp_path):
+    write(tmp_path / 'comments.db', format='sqlite')
+    write(tmp_path / 'comments.db', format='sqlite')
+    rows = sqlite3.connect(str(tmp_path / 'comments.db')).execute('SELECT cid, heart FROM comments').fetchall()
+    assert rows == [('Ugz1', 1), ('Ugz1.A', 0)]
+
+
+def test_that_sqlite_appends_in_append_mode(tmp_path):
+    write(tmp_path / 'comments.db', format='sqlite')
+    write(tmp_path / 'comments.db', format='sqlite', mode='a')
+    rows = sqlite3.connect(str(tmp_path / 'comments.db')).execute('SELECT cid, heart FROM comments').fetchall()
+    assert rows == [('Ugz1', 1), ('Ugz1.A', 0)] * 2
+
+
+def test_that_gzip_output_can_be_read_back(tmp_path):
+    write(tmp_path / 'comments.json.gz', compression='gzip')
+    with gzip.open(str(tmp_path / 'comments.json.gz'), 'rt', encoding='utf8') as fp:
+        assert [json.loads(line) for line in fp] == COMMENTS
+
+
+def test_that_unknown_formats_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        open_writer(str(tmp_path / 'comments.xml'), 'xml')
+
+
+@pytest.mark.parametrize('path, kwargs', [('comments.json', {}), ('comments.json', {'pretty': True}),
+                                          ('comments.csv', {'format': 'csv'}), ('comments.db', {'format': 'sqlite'})])
+def test_that_compact_comments_are_written_like_dicts(tmp_path, path, kwargs):
+    write(tmp_path / ('dicts-' + path), **kwargs)
+    write(tmp_path / path, [Comment(**comment) for comment in COMMENTS], **kwargs)
+    if kwargs.get('format') == 'sqlite':
+        query = 'SELECT * FROM comments'
+        assert sqlite3.connect(str(tmp_path / path)).execute(query).fetchall() == \
+            sqlite3.connect(str(tmp_path / ('dicts-' + path))).execute(query).fetchall()
+    else:
+        assert (tmp_path / path).read_text(encoding='utf8') == (tmp_path / ('dicts-' + path)).read_text(encoding='utf8')
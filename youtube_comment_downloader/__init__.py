@@ -1,21 +1,23 @@
 import argparse
-import io
 import json
 import os
 import sys
 import time
+from itertools import islice
 
-from .downloader import YoutubeCommentDownloader, SORT_BY_POPULAR, SORT_BY_RECENT
-
-INDENT = 4
-
-
-def to_json(comment, indent=None):
-    comment_str = json.dumps(comment, ensure_ascii=False, indent=indent)
-    if indent is None:
-        return comment_str
-    padding = ' ' * (2 * indent) if indent else ''
-    return ''.join(padding + line for line in comment_str.splitlines(True))
+from .batch import download_batch, read_targets
+from .checkpoint import Checkpoint, count_lines
+from .community import POST_FIELDS
+from .debugarchive import ARCHIVE_EXTENSION, DebugArchive
+from .downloader import YoutubeCommentDownloader, SORT_BY_POPULAR, SORT_BY_RECENT, YOUTUBE_VIDEO_URL
+from .faststart import YtcfgCache
+from .incremental import SeenStore
+from .pacing import RateLimiter
+from .record import check_fields
+from .responsecache import ResponseCache
+from .stats import DownloadStats, PageProfiler
+from .transport import Transport
+from .writers import COMPRESSIONS, FORMATS, INDENT, Progress, open_writer, to_json
 
 
 def main(argv = None):
@@ -25,17 +27,70 @@ def main(argv = None):
     parser.add_argument('--url', '-u', help='Youtube URL for which to download the comments')
     parser.add_argument('--output', '-o', help='Output filename (output format is line delimited JSON)')
     parser.add_argument('--pretty', '-p', action='store_true', help='Change the output format to indented JSON')
+    parser.add_argument('--format', '-f', choices=FORMATS, default='json',
+                        help='Output format: line delimited JSON (default), CSV or an SQLite database')
+    parser.add_argument('--compress', '-z', choices=COMPRESSIONS, default=None, help='Compress the output file')
     parser.add_argument('--limit', '-l', type=int, help='Limit the number of comments')
     parser.add_argument('--language', '-a', type=str, default=None, help='Language for Youtube generated text (e.g. en)')
     parser.add_argument('--sort', '-s', type=int, default=SORT_BY_RECENT,
                         help='Whether to download popular (0) or recent comments (1). Defaults to 1')
-    parser.add_argument('--debug', '-d', action='store_true', help="Ouput debugging files to help diagnose issues.")
+    parser.add_argument('--debug', '-d', action='store_true',
+                        help='Capture responses to a compressed debug archive to help diagnose issues')
+    parser.add_argument('--debug-every', type=int, default=1, help='Only capture every Nth continuation page with --debug')
+    parser.add_argument('--debug-max-mb', type=int, default=512, help='Stop capturing once the debug archive holds this many MB of JSON')
     parser.add_argument('--community', '-c', help='Youtube username for which to download Community posts' )
+    parser.add_argument('--post-comments', action='store_true',
+                        help='Also download the comments of every Community post (stored with the post)')
+    parser.add_argument('--max-comments-per-post', type=int, default=None,
+                        help='Download at most this many comments (including replies) of every Community post')
+    parser.add_argument('--comment-workers', type=int, default=4,
+                        help='Number of Community posts for which to download comments concurrently')
     parser.add_argument('--cookies', '-e', type=str, default=None, help='Use a Netscape HTTP Cookie File with your requests')
     parser.add_argument('--useragent', '-t', type=str, default=None, help='Use custom User Agent (to be used with Cookies)')
+    parser.add_argument('--rate', '-r', type=float, default=10.0,
+                        help='Initial number of requests per second, adjusted automatically when throttled')
+    parser.add_argument('--fields', default=None,
+                        help='Comma separated fields to download (e.g. cid,text,votes), skipping the work for the others')
+    parser.add_argument('--no-replies', action='store_true', help='Only download top level comments')
+    parser.add_argument('--max-replies-per-thread', type=int, default=None,
+                        help='Download at most this many replies of every comment')
+    parser.add_argument('--max-requests', type=int, default=None,
+                        help='Stop after this many continuation requests (per video), resumable with --checkpoint')
+    parser.add_argument('--no-time-parsed', action='store_true', help='Do not add parsed timestamps (time_parsed) to comments')
+    parser.add_argument('--incremental', '-n',
+                        help='Only download comments that are not yet in this database (which is updated afterwards)')
+    parser.add_argument('--fast-start', '-F',
+                        help='Cache the Youtube configuration in this file and use it to skip the watch page')
+    parser.add_argument('--cache', help='Keep responses in this file and reuse them instead of downloading them again')
+    parser.add_argument('--cache-ttl', type=float, default=None, help='Download responses older than this many hours again')
+    parser.add_argument('--cache-max-mb', type=int, default=1024,
+                        help='Evict the least recently used responses once the cache holds this many MB')
+    parser.add_argument('--offline', action='store_true',
+                        help='Only use responses from the cache, failing on anything that is not in it')
+    parser.add_argument('--checkpoint', '-k', help='Periodically save progress to this file and resume from it when restarted')
+    parser.add_argument('--input', '-i', help='File with one Youtube ID/URL per line to download in batch')
+    parser.add_argument('--output-dir', '-O', help='Output directory for batch downloads (one file per video)')
+    parser.add_argument('--jobs', '-j', type=int, default=4, help='Number of videos to download concurrently in batch mode')
+    parser.add_argument('--reply-workers', '-w', type=int, default=None,
+                        help='Fetch reply threads concurrently using this many workers')
+    parser.add_argument('--pool-size', type=int, default=32,
+                        help='Number of connections to Youtube kept open for reuse by concurrent requests')
+    parser.add_argument('--stats', nargs='?', const='-', default=None,
+                        help='Print a summary of requests and time per stage, or write it as JSON to this file')
+    parser.add_argument('--profile', type=int, default=None,
+                        help='Profile the first N pages and write the report next to the output file')
+    parser.add_argument('--profile-type', choices=('cpu', 'memory'), default='cpu',
+                        help='Profile with cProfile (cpu, default) or tracemalloc (memory)')
 
     try:
         args = parser.parse_args() if argv is None else parser.parse_args(argv)
+        args.fields = check_fields(args.fields)
+        if args.fields and 'time_parsed' in args.fields and args.no_time_parsed:
+            raise ValueError('the time_parsed field cannot be combined with --no-time-parsed')
+        args.max_replies = 0 if args.no_replies else args.max_replies_per_thread
+
+        if args.offline and not args.cache:
+            raise ValueError('offline mode needs a response cache (--cache)')
 
         youtube_id = args.youtubeid
         youtube_url = args.url
@@ -46,6 +101,14 @@ def main(argv = None):
         user_agent = args.useragent
         cookie_file = args.cookies
 
+        if args.input:
+            if not args.output_dir:
+                parser.print_usage()
+                raise ValueError('you need to specify an output directory for batch downloads')
+            if args.checkpoint or args.debug:
+                raise ValueError('--checkpoint and --debug cannot be used for batch downloads')
+            return download_videos(args)
+
         if (not youtube_id and not youtube_url and not community) or not output:
             parser.print_usage()
             raise ValueError('you need to specify a Youtube ID/URL and an output filename')
@@ -57,56 +120,166 @@ def main(argv = None):
 
         if args.debug:
             print("== Verbose Debug Output Enabled ==")
-            if youtube_id:
-                args.debug = os.path.join("debug", f"{youtube_id}", f"{time.strftime('%y-%m-%d-%H-%M-%S')}")
-            else:
-
-                args.debug = os.path.join("debug", f"{time.strftime('%y-%m-%d-%H-%M-%S')}")
-            try:
-                os.makedirs(f"{args.debug}")
-                print(f"Making directory for debug output analysis: {args.debug}")
-            except FileExistsError:
-                print("Using existing debug folder")
-
-        downloader = YoutubeCommentDownloader()
+            debug_dir = os.path.join("debug", youtube_id) if youtube_id else "debug"
+            os.makedirs(debug_dir, exist_ok=True)
+            archive = os.path.join(debug_dir, time.strftime('%y-%m-%d-%H-%M-%S') + ARCHIVE_EXTENSION)
+            args.debug = DebugArchive(archive, every=args.debug_every, max_bytes=args.debug_max_mb << 20)
+            print(f"Writing debug records to {archive}")
+
+        checkpoint = None
+        mode, skip, count = 'w', 0, 0
+        if args.checkpoint:
+            if pretty or community or args.format != 'json' or args.compress:
+                raise ValueError('a checkpoint can only be used when downloading comments as uncompressed line delimited JSON')
+            if args.incremental:
+                raise ValueError('a checkpoint cannot be combined with an incremental download')
+            checkpoint = Checkpoint(args.checkpoint)
+            if checkpoint.resumes(youtube_url or YOUTUBE_VIDEO_URL.format(youtube_id=youtube_id)):
+                written = count_lines(output)
+                if written < checkpoint.state['emitted']:
+                    # The output lost comments that the checkpoint counts as written, resuming would skip them
+                    print('The output has fewer comments than the checkpoint, starting over')
+                    checkpoint.clear()
+                else:
+                    # Append to the existing output, skipping the comments that were written after the checkpoint
+                    mode, skip, count = 'a', written - checkpoint.state['emitted'], written
+                    print('Resuming from checkpoint after %d comment(s)' % written)
+
+        if args.incremental and community:
+            raise ValueError('an incremental download can only be used when downloading comments')
+        seen = SeenStore(args.incremental) if args.incremental else None
+        ytcfg_cache = YtcfgCache(args.fast_start) if args.fast_start else None
+        profiler = None
+        if args.profile:
+            extension = '.prof' if args.profile_type == 'cpu' else '.memory.txt'
+            profiler = PageProfiler(output + extension, args.profile, args.profile_type)
+        stats = DownloadStats(profiler=profiler)
+        downloader = YoutubeCommentDownloader(RateLimiter(rate=args.rate), stats, Transport(pool_maxsize=args.pool_size),
+                                              open_cache(args))
         if cookie_file and user_agent:
             downloader.use_cookies(cookie_file, user_agent)        
         if youtube_id or youtube_url:
             print('Downloading Youtube comments for', youtube_id or youtube_url)
-            generator = (
-                downloader.get_comments(youtube_id, args.debug, args.sort, args.language)
+            comments = (
+                downloader.get_comments(youtube_id, args.debug, args.sort, args.language,
+                                        reply_workers=args.reply_workers, checkpoint=checkpoint,
+                                        parse_time=not args.no_time_parsed, seen=seen, ytcfg_cache=ytcfg_cache,
+                                        fields=args.fields, max_replies=args.max_replies,
+                                        max_requests=args.max_requests)
                 if youtube_id
-                else downloader.get_comments_from_url(youtube_url, args.debug, args.sort, args.language)
+                else downloader.get_comments_from_url(youtube_url, args.debug, args.sort, args.language,
+                                                      reply_workers=args.reply_workers, checkpoint=checkpoint,
+                                                      parse_time=not args.no_time_parsed, seen=seen,
+                                                      ytcfg_cache=ytcfg_cache, fields=args.fields,
+                                                      max_replies=args.max_replies, max_requests=args.max_requests)
             )
+            generator = islice(comments, skip, None)
         elif community:
             print('Downloading Youtube Community for', community)
             generator = (
-                downloader.get_community(community, args.debug, args.sort, args.language)
+                downloader.get_community(community, args.debug, args.sort, args.language,
+                                         comments=args.post_comments, comment_workers=args.comment_workers,
+                                         max_comments=args.max_comments_per_post,
+                                         parse_time=not args.no_time_parsed, max_replies=args.max_replies,
+                                         max_requests=args.max_requests)
             )
 
-        count = 1
-        with io.open(output, 'w', encoding='utf8') as fp:
-            sys.stdout.write(f"Downloaded %d {'posts(s)' if community else 'comment(s)'}\r" % count)
-            sys.stdout.flush()
-            start_time = time.time()
-
-            if pretty:
-                fp.write('{\n' + ' ' * INDENT + '"comments": [\n')
-
-            comment = next(generator, None)
-            while comment:
-                comment_str = to_json(comment, indent=INDENT if pretty else None)
-                comment = None if limit and count >= limit else next(generator, None)  # Note that this is the next comment
-                comment_str = comment_str + ',' if pretty and comment is not None else comment_str
-                print(comment_str.decode('utf-8') if isinstance(comment_str, bytes) else comment_str, file=fp)
-                sys.stdout.write(f"Downloaded %d {'posts(s)' if community else 'comment(s)'}\r" % count)
-                sys.stdout.flush()
+        progress = Progress('post(s)' if community else 'comment(s)')
+        progress.update(count, force=True)
+        start_time = time.time()
+        if limit:
+            generator = islice(generator, max(0, limit - count))
+        output_time = 0.0
+        fields = args.fields
+        if community:
+            fields = POST_FIELDS + ('comments', 'comments_error') if args.post_comments else POST_FIELDS
+        with open_writer(output, args.format, args.compress, pretty, mode, fields=fields) as writer:
+            if checkpoint:
+                checkpoint.sync = writer.sync
+            for comment in generator:
+                write_time = time.perf_counter()
+                writer.write(comment)
+                output_time += time.perf_counter() - write_time
                 count += 1
+                progress.update(count)
+            write_time = time.perf_counter()
+        stats.add('output', output_time + time.perf_counter() - write_time)
+        progress.update(count, force=True)
+        if profiler:
+            profiler.stop()
 
-            if pretty:
-                fp.write(' ' * INDENT +']\n}')
+        if seen is not None:
+            comments.close()
+            seen.close()
+        if checkpoint and limit and count >= limit:
+            # The download reached its limit, so there is nothing left to resume
+            comments.close()
+            checkpoint.clear()
+        if args.debug:
+            args.debug.close()
+        if downloader.cache is not None:
+            downloader.cache.close()
         print('\n[{:.2f} seconds] Done!'.format(time.time() - start_time))
+        if downloader.stats.avoided:
+            print('Skipped {} request(s) for replies or over the request budget'.format(downloader.stats.avoided))
+        if args.stats:
+            report_stats(downloader, args.stats)
 
     except Exception as e:
         print('Error:', str(e))
         sys.exit(1)
+
+
+def open_cache(args):
+    if not args.cache:
+        return None
+    ttl = args.cache_ttl * 3600 if args.cache_ttl is not None else None
+    return ResponseCache(args.cache, ttl=ttl, max_bytes=args.cache_max_mb << 20, offline=args.offline)
+
+
+def report_stats(downloader, path):
+    summary = downloader.stats.summary()
+    summary['rate_limiter'] = downloader.rate_limiter.stats()
+    summary['transport'] = downloader.transport.stats()
+    if downloader.cache is not None:
+        summary['response_cache'] = downloader.cache.stats()
+    if path == '-':
+        print(DownloadStats.format(summary))
+    else:
+        with open(path, 'w', encoding='utf8') as fp:
+            json.dump(summary, fp, indent=INDENT)
+
+
+def download_videos(args):
+    targets = read_targets(args.input)
+    print('Downloading Youtube comments for %d video(s) using %d job(s)' % (len(targets), args.jobs))
+
+    downloader = YoutubeCommentDownloader(RateLimiter(rate=args.rate), transport=Transport(pool_maxsize=args.pool_size),
+                                          cache=open_cache(args))
+    if args.cookies and args.useragent:
+        downloader.use_cookies(args.cookies, args.useragent)
+
+    def report(entry):
+        status = 'failed (%s)' % entry['error'] if entry['error'] else 'done'
+        print('[{:.2f} seconds] {}: {} comment(s), {}'.format(entry['duration'], entry['id'], entry['comments'], status))
+
+    seen = SeenStore(args.incremental) if args.incremental else None
+    ytcfg_cache = YtcfgCache(args.fast_start) if args.fast_start else None
+    manifest = download_batch(downloader, targets, args.output_dir, jobs=args.jobs, limit=args.limit,
+                              callback=report, format=args.format, compression=args.compress,
+                              sort_by=args.sort, language=args.language,
+                              reply_workers=args.reply_workers, parse_time=not args.no_time_parsed, seen=seen,
+                              ytcfg_cache=ytcfg_cache, fields=args.fields, max_replies=args.max_replies,
+                              max_requests=args.max_requests)
+    if seen is not None:
+        seen.close()
+    if downloader.cache is not None:
+        downloader.cache.close()
+    print('\n[{:.2f} seconds] Done! {} comment(s) from {} video(s), {} failed'.format(
+        manifest['duration'], manifest['comments'], manifest['total'], manifest['failed']))
+    if downloader.stats.avoided:
+        print('Skipped {} request(s) for replies or over the request budget'.format(downloader.stats.avoided))
+    if args.stats:
+        report_stats(downloader, args.stats)
+    if manifest['failed']:
+        sys.exit(1)
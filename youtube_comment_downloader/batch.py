@@ -0,0 +1,83 @@
+import io
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .downloader import YOUTUBE_VIDEO_URL
+from .faststart import YT_VIDEO_ID_RE
+from .writers import open_writer
+
+MANIFEST_FILENAME = 'manifest.json'
+
+EXTENSIONS = {'json': '.json', 'csv': '.csv', 'sqlite': '.db', 'gzip': '.gz', 'zstd': '.zst'}
+
+
+def read_targets(path):
+    # One Youtube ID or URL per line, blank lines and lines starting with # are ignored
+    with io.open(path, 'r', encoding='utf8') as fp:
+        targets = [line.strip() for line in fp]
+    return [target for target in targets if target and not target.startswith('#')]
+
+
+def video_id(target):
+    if '/' not in target:
+        return target
+    match = re.search(YT_VIDEO_ID_RE, target)
+    return match.group(1) if match else re.sub(r'[^A-Za-z0-9_-]+', '_', target).strip('_')
+
+
+def download_video(downloader, target, output_dir, limit=None, format='json', compression=None, fields=None, **kwargs):
+    youtube_id = video_id(target)
+    url = target if '/' in target else YOUTUBE_VIDEO_URL.format(youtube_id=target)
+    output = os.path.join(output_dir, youtube_id + EXTENSIONS[format] + EXTENSIONS.get(compression, ''))
+    entry = {'id': youtube_id, 'url': url, 'output': output, 'comments': 0, 'error': None}
+
+    start_time = time.time()
+    try:
+        with open_writer(output, format, compression, fields=fields) as writer:
+            for comment in downloader.get_comments_from_url(url, fields=fields, **kwargs):
+                writer.write(comment)
+                entry['comments'] += 1
+                if limit and entry['comments'] >= limit:
+                    break
+    except Exception as e:
+        entry['error'] = '%s: %s' % (type(e).__name__, e)
+    entry['duration'] = round(time.time() - start_time, 3)
+    return entry
+
+
+def download_batch(downloader, targets, output_dir, jobs=4, limit=None, callback=None, **kwargs):
+    # Download the comments of many videos using a pool of threads sharing a single downloader. Every video is
+    # written to its own output file (see open_writer) and a failing video never stops the others. A manifest with
+    # the per video results is written to the output directory and returned. The downloader's stats, rate limiter
+    # and response cache, and the `seen` store and `ytcfg_cache` in kwargs, are shared by all threads, which is
+    # why each of them guards its state with a lock.
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    # Targets that end up in the same output file are only downloaded once
+    unique = {}
+    for target in targets:
+        unique.setdefault(video_id(target), target)
+    targets = list(unique.values())
+
+    start_time = time.time()
+    entries = [None] * len(targets)
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = {executor.submit(download_video, downloader, target, output_dir, limit, **kwargs): index
+                   for index, target in enumerate(targets)}
+        for future in as_completed(futures):
+            entry = future.result()
+            entries[futures[future]] = entry
+            if callback:
+                callback(entry)
+
+    manifest = {'videos': entries,
+                'total': len(entries),
+                'comments': sum(entry['comments'] for entry in entries),
+                'failed': sum(1 for entry in entries if entry['error']),
+                'duration': round(time.time() - start_time, 3)}
+    with io.open(os.path.join(output_dir, MANIFEST_FILENAME), 'w', encoding='utf8') as fp:
+        json.dump(manifest, fp, ensure_ascii=False, indent=4)
+    return manifest
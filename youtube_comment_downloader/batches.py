@@ -0,0 +1,106 @@
+from .record import FIELDS, parse_count
+
+BATCH_FORMATS = ('dict', 'arrow', 'numpy')
+
+# Column types of a batch, the other fields are strings. Counts and timestamps (seconds since the epoch) are
+# parsed into integers. Only the integer columns of NumPy batches need a value for missing entries.
+INT_FIELDS = ('votes', 'replies', 'time_parsed')
+BOOL_FIELDS = ('heart', 'reply')
+MISSING_INT = -1
+
+
+def parse_counts(values):
+    # Most counts are plain numbers or empty, only the others ('1.2K', '1,234') go through parse_count
+    return [None if value is None else int(value) if value.isdigit() else parse_count(value) if value else 0
+            for value in values]
+
+
+def parse_timestamps(values):
+    return [int(value) if value is not None else None for value in values]
+
+
+COLUMN_PARSERS = {'votes': parse_counts, 'replies': parse_counts, 'time_parsed': parse_timestamps}
+
+
+def parse_columns(columns):
+    # Turns the counts and timestamps of a dict of lists into ints, in place
+    for field, values in columns.items():
+        if field in COLUMN_PARSERS:
+            columns[field] = COLUMN_PARSERS[field](values)
+        elif field in BOOL_FIELDS:
+            columns[field] = [bool(value) for value in values]
+    return columns
+
+
+def to_columns(comments, fields):
+    # Turns a list of comment dicts into a dict of lists, with counts and timestamps as ints
+    return parse_columns({field: [comment.get(field) for comment in comments] for field in fields})
+
+
+def to_arrow(columns):
+    try:
+        import pyarrow
+    except ImportError:
+        raise RuntimeError('the pyarrow package is required for arrow batches')
+    types = {field: pyarrow.int64() if field in INT_FIELDS else pyarrow.bool_() if field in BOOL_FIELDS
+             else pyarrow.string() for field in columns}
+    schema = pyarrow.schema([(field, field_type) for field, field_type in types.items()])
+    return pyarrow.RecordBatch.from_pydict(columns, schema=schema)
+
+
+def to_numpy(columns):
+    try:
+        import numpy
+    except ImportError:
+        raise RuntimeError('the numpy package is required for numpy batches')
+    arrays = {}
+    for field, values in columns.items():
+        if field in INT_FIELDS:
+            values = [MISSING_INT if value is None else value for value in values]
+            arrays[field] = numpy.array(values, dtype=numpy.int64)
+        elif field in BOOL_FIELDS:
+            arrays[field] = numpy.array(values, dtype=numpy.bool_)
+        else:
+            arrays[field] = numpy.array(values, dtype=object)
+    return arrays
+
+
+CONVERTERS = {'dict': lambda columns: columns, 'arrow': to_arrow, 'numpy': to_numpy}
+
+
+def comment_batches(comments, batch_size=1000, fields=FIELDS, format='dict'):
+    # Groups comment dicts into columnar batches of up to `batch_size` comments: a dict of lists ('dict'), a
+    # pyarrow.RecordBatch ('arrow') or a dict of NumPy arrays ('numpy', where missing integers are MISSING_INT)
+    if format not in BATCH_FORMATS:
+        raise ValueError('unknown batch format: %s' % format)
+    convert = CONVERTERS[format]
+    batch = []
+    for comment in comments:
+        batch.append(comment)
+        if len(batch) >= batch_size:
+            yield convert(to_columns(batch, fields))
+            batch = []
+    if batch:
+        yield convert(to_columns(batch, fields))
+
+
+def column_batches(pages, batch_size=1000, format='dict'):
+    # Like comment_batches, for comments that already come as a dict of lists per page (see
+    # YoutubeCommentDownloader.extract_columns)
+    if format not in BATCH_FORMATS:
+        raise ValueError('unknown batch format: %s' % format)
+    convert = CONVERTERS[format]
+    batch, size = None, 0
+    for page in pages:
+        page = parse_columns(page)
+        if batch is None:
+            batch = {field: [] for field in page}
+        for field, values in page.items():
+            batch[field].extend(values)
+        size += len(next(iter(page.values())))
+        while size >= batch_size:
+            yield convert({field: values[:batch_size] for field, values in batch.items()})
+            batch = {field: values[batch_size:] for field, values in batch.items()}
+            size -= batch_size
+    if size:
+        yield convert(batch)
@@ -0,0 +1,92 @@
+import json
+import re
+
+YT_CFG_START_RE = re.compile(r'ytcfg\.set\s*\(\s*(?={)')
+YT_INITIAL_DATA_START_RE = re.compile(r'(?:window\s*\[\s*["\']ytInitialData["\']\s*\]|ytInitialData)\s*=\s*(?={)')
+
+# Longest text a start marker can span, so markers split over two chunks are still found
+MARKER_OVERLAP = 64
+CHUNK_SIZE = 1 << 16
+
+
+class BootstrapExtractor:
+    # Finds the ytcfg and ytInitialData objects in a watch (or community) page while it is being downloaded.
+    # Instead of running regular expressions over the complete HTML, the start of each object is located and
+    # the object is decoded in place with a raw JSON decoder. Only the text of an object that is still being
+    # received is kept in memory. Decoding is retried each time the pending text has doubled in size.
+
+    def __init__(self):
+        self.decoder = json.JSONDecoder()
+        self.targets = {'ytcfg': YT_CFG_START_RE, 'data': YT_INITIAL_DATA_START_RE}
+        self.found = {}
+        self.buffer = ''
+        self.offset = 0  # Position of self.buffer within the complete text
+        self.pending = {}  # Target name -> (absolute start position, buffer size needed for the next attempt)
+
+    @property
+    def done(self):
+        return len(self.found) == len(self.targets)
+
+    def feed(self, chunk, eof=False):
+        scan_from = max(0, len(self.buffer) - MARKER_OVERLAP)
+        self.buffer += chunk
+        for name, pattern in self.targets.items():
+            if name not in self.found:
+                self.process(name, pattern, scan_from, eof)
+        self.trim()
+        return self.done
+
+    def process(self, name, pattern, scan_from, eof):
+        while name not in self.found:
+            if name not in self.pending:
+                match = pattern.search(self.buffer, scan_from)
+                if not match:
+                    return
+                self.pending[name] = (self.offset + match.end(), 0)
+            start, retry_size = self.pending[name]
+            position = start - self.offset
+            if not eof and len(self.buffer) - position < retry_size:
+                return  # Wait for more data before trying again
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, position)
+            except json.JSONDecodeError as e:
+                # Errors at the very end of the text (or in a string running up to it) mean the object is incomplete
+                truncated = e.msg.startswith('Unterminated string') or e.pos >= len(self.buffer) - MARKER_OVERLAP
+                if truncated and not eof:
+                    self.pending[name] = (start, 2 * (len(self.buffer) - position))
+                    return
+                value, end = None, position + 1  # Not valid JSON, look for the next occurrence
+            del self.pending[name]
+            if isinstance(value, dict) and (name != 'ytcfg' or 'INNERTUBE_API_KEY' in value):
+                self.found[name] = value
+            scan_from = end
+
+    def trim(self):
+        # Drop everything before the earliest text we might still need
+        keep = [start - self.offset for start, _ in self.pending.values()]
+        keep.append(max(0, len(self.buffer) - MARKER_OVERLAP))
+        cut = min(keep)
+        if cut > 0:
+            self.buffer = self.buffer[cut:]
+            self.offset += cut
+
+    def result(self):
+        return self.found.get('ytcfg'), self.found.get('data')
+
+
+def extract_bootstrap(chunks):
+    # Returns (ytcfg, ytInitialData) from an iterable of text chunks, either can be None when it is missing
+    extractor = BootstrapExtractor()
+    for chunk in chunks:
+        if extractor.feed(chunk):
+            break
+    else:
+        extractor.feed('', eof=True)
+    return extractor.result()
+
+
+def iter_text(response, chunk_size=CHUNK_SIZE):
+    # Yields the body of a streamed response as text
+    if response.encoding is None:
+        response.encoding = 'utf-8'
+    return response.iter_content(chunk_size=chunk_size, decode_unicode=True)
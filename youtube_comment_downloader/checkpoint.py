@@ -0,0 +1,70 @@
+import io
+import json
+import os
+import time
+
+
+class Checkpoint:
+    # Persists the continuation frontier of a comment download, so that an interrupted download can be resumed
+    # without starting over from the watch page. The state is only ever saved between two continuation pages,
+    # together with the number of comments that had been emitted at that point. Set `sync` to a function that
+    # makes the output durable (e.g. Writer.sync), it is called before every save so that the saved count never
+    # gets ahead of what is on disk.
+
+    def __init__(self, path, interval=10, sync=None):
+        self.path = path
+        self.interval = interval
+        self.sync = sync
+        self.last_save = 0
+        self.state = self.load()
+
+    def load(self):
+        try:
+            with io.open(self.path, 'r', encoding='utf8') as fp:
+                return json.load(fp)
+        except FileNotFoundError:
+            return None
+
+    def resumes(self, url):
+        return bool(self.state) and self.state.get('url') == url
+
+    def start(self, url, ytcfg, endpoint):
+        self.state = {'url': url, 'ytcfg': ytcfg, 'endpoint': endpoint, 'continuations': [endpoint], 'emitted': 0}
+        self.save()
+
+    def update(self, continuations, emitted, force=False):
+        self.state['continuations'] = list(continuations)
+        self.state['emitted'] = emitted
+        if force or time.time() - self.last_save >= self.interval:
+            self.save()
+
+    def save(self):
+        if self.sync:
+            self.sync()
+        # Write to a temporary file first, an interruption while saving must not destroy the previous checkpoint
+        tmp_path = self.path + '.tmp'
+        with io.open(tmp_path, 'w', encoding='utf8') as fp:
+            json.dump(self.state, fp, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self.last_save = time.time()
+
+    def clear(self):
+        self.state = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def count_lines(path):
+    # Count the complete lines of a line delimited output file, dropping a partially written last line
+    if not os.path.exists(path):
+        return 0
+    count = 0
+    with io.open(path, 'rb+') as fp:
+        end = 0
+        for line in fp:
+            if not line.endswith(b'\n'):
+                break
+            count += 1
+            end += len(line)
+        fp.truncate(end)
+    return count
@@ -0,0 +1,68 @@
+# Fields of a community post, in the order in which the downloader produces them. With comments=True, the post's
+# comments are added as a list under 'comments'.
+POST_FIELDS = ('pid', 'text', 'time', 'author', 'channel', 'votes', 'comment_count', 'attachments', 'time_parsed')
+# Fields holding lists, which the CSV and SQLite writers store as JSON
+NESTED_FIELDS = ('attachments', 'comments')
+
+
+def text_of(value):
+    # Text of a simpleText or runs object
+    if not value:
+        return ''
+    if 'simpleText' in value:
+        return value['simpleText']
+    return ''.join(run.get('text', '') for run in value.get('runs', []))
+
+
+def largest_thumbnail(image):
+    thumbnails = (image or {}).get('thumbnails', [])
+    return thumbnails[-1].get('url') if thumbnails else None
+
+
+def post_renderer(item):
+    # The backstagePostRenderer (or sharedPostRenderer) of a continuation item, None for other items
+    thread = item.get('backstagePostThreadRenderer')
+    if thread is None:
+        return None
+    post = thread.get('post', {})
+    return post.get('backstagePostRenderer') or post.get('sharedPostRenderer')
+
+
+def extract_attachments(attachment):
+    if not attachment:
+        return []
+    if 'postMultiImageRenderer' in attachment:
+        images = attachment['postMultiImageRenderer'].get('images', [])
+        return [image for item in images for image in extract_attachments(item)]
+    if 'backstageImageRenderer' in attachment:
+        return [{'type': 'image', 'url': largest_thumbnail(attachment['backstageImageRenderer'].get('image'))}]
+    if 'videoRenderer' in attachment:
+        video = attachment['videoRenderer']
+        return [{'type': 'video', 'video_id': video.get('videoId'), 'title': text_of(video.get('title'))}]
+    if 'pollRenderer' in attachment:
+        poll = attachment['pollRenderer']
+        return [{'type': 'poll', 'choices': [text_of(choice.get('text')) for choice in poll.get('choices', [])],
+                 'votes': text_of(poll.get('totalVotes'))}]
+    return [{'type': next(iter(attachment))}]
+
+
+def extract_post(renderer, time_parser=None):
+    buttons = renderer.get('actionButtons', {}).get('commentActionButtonsRenderer', {})
+    reply_button = buttons.get('replyButton', {}).get('buttonRenderer', {})
+    post = {'pid': renderer.get('postId'),
+            'text': text_of(renderer.get('contentText') or renderer.get('content')),
+            'time': text_of(renderer.get('publishedTimeText')),
+            'author': text_of(renderer.get('authorText') or renderer.get('displayName')),
+            'channel': renderer.get('authorEndpoint', {}).get('browseEndpoint', {}).get('browseId'),
+            'votes': text_of(renderer.get('voteCount')) or '0',
+            'comment_count': text_of(reply_button.get('text')) or '0',
+            'attachments': extract_attachments(renderer.get('backstageAttachment'))}
+    original = renderer.get('originalPost', {}).get('backstagePostRenderer')
+    if original:
+        # A shared post, which links to the original one
+        post['attachments'].append({'type': 'post', 'pid': original.get('postId')})
+
+    time_parsed = time_parser.parse(post['time']) if time_parser and post['time'] else None
+    if time_parsed is not None:
+        post['time_parsed'] = time_parsed
+    return post
@@ -0,0 +1,139 @@
+import argparse
+import atexit
+import gzip
+import json
+import queue
+import sys
+import threading
+import time
+import zlib
+
+from .writers import fast_json, open_text, orjson
+
+ARCHIVE_EXTENSION = '.jsonl.gz'
+
+
+class DebugArchive:
+    # Collects debug records (responses, continuations, items...) and appends them to a single gzip compressed
+    # JSONL file from a background thread, so that capturing them costs the download little more than encoding
+    # them. Records are encoded when they are captured, as the data may still change afterwards (ytcfg does) and
+    # a line takes much less memory than the parsed response. Only every `every`th continuation page is
+    # captured, and records are dropped instead of blocking when more than `queue_bytes` are waiting to be
+    # written or once `max_bytes` of uncompressed JSON have been captured.
+
+    def __init__(self, path, every=1, max_bytes=512 << 20, queue_bytes=64 << 20):
+        self.path = path
+        self.every = max(1, every)
+        self.max_bytes = max_bytes
+        self.queue_bytes = queue_bytes
+        self.fp = open_text(path, 'w', 'gzip')
+        self.dumps = fast_json if orjson else (lambda record: json.dumps(record, ensure_ascii=False))
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.sequence = 0
+        self.queued = 0
+        self.written = 0
+        self.bytes = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self.run, name='debug-archive', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)  # Keep the records that explain an error which ended the program
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def record(self, name, data, **keys):
+        # Queue a record, `keys` (e.g. page=3, item=7) identify it within the download
+        if keys.get('page', 0) % self.every:
+            return
+        with self.lock:
+            sequence = self.sequence
+            self.sequence += 1
+        record = {'seq': sequence, 'time': time.time(), 'name': name}
+        record.update(keys)
+        record['data'] = data
+        try:
+            line = self.dumps(record) + '\n'
+        except (TypeError, ValueError):
+            line = json.dumps(record, ensure_ascii=False, default=repr) + '\n'
+        with self.lock:
+            if self.queued + len(line) > self.queue_bytes or self.bytes + len(line) > self.max_bytes:
+                self.dropped += 1
+                return
+            self.queued += len(line)
+            self.bytes += len(line)
+        self.queue.put(line)
+
+    def run(self):
+        while True:
+            line = self.queue.get()
+            if line is None:
+                break
+            lines = [line]
+            # Write whatever else is waiting in the same call
+            while len(lines) < 1000:
+                try:
+                    line = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if line is None:
+                    self.write(lines)
+                    return
+                lines.append(line)
+            self.write(lines)
+
+    def write(self, lines):
+        self.fp.write(''.join(lines))
+        with self.lock:
+            self.written += len(lines)
+            self.queued -= sum(len(line) for line in lines)
+
+    def close(self):
+        atexit.unregister(self.close)
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        if not self.fp.closed:
+            self.fp.close()
+
+    def stats(self):
+        with self.lock:
+            return {'records': self.written, 'bytes': self.bytes, 'dropped': self.dropped}
+
+
+def read_archive(path, name=None, **keys):
+    # Yields the records of a debug archive, optionally only those with the given name and keys
+    # (e.g. read_archive(path, 'continuationResponse', page=3)). A truncated archive is read up to the break.
+    with gzip.open(path, 'rt', encoding='utf8') as fp:
+        try:
+            for line in fp:
+                if not line.endswith('\n'):
+                    break
+                record = json.loads(line)
+                if name is not None and record['name'] != name:
+                    continue
+                if all(record.get(key) == value for key, value in keys.items()):
+                    yield record
+        except (EOFError, zlib.error):
+            pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Extract records from a youtube-comment-downloader debug archive')
+    parser.add_argument('archive', help='Debug archive (%s file)' % ARCHIVE_EXTENSION)
+    parser.add_argument('--name', '-n', help='Only records with this name (e.g. continuationResponse)')
+    parser.add_argument('--page', '-p', type=int, help='Only records of this continuation page')
+    parser.add_argument('--item', '-i', type=int, help='Only records of this item')
+    parser.add_argument('--data', action='store_true', help='Only output the captured data of each record')
+    args = parser.parse_args(argv)
+
+    keys = {key: getattr(args, key) for key in ('page', 'item') if getattr(args, key) is not None}
+    for record in read_archive(args.archive, args.name, **keys):
+        sys.stdout.write(json.dumps(record['data'] if args.data else record, ensure_ascii=False) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,25 @@
 from __future__ import print_function
 
+import itertools
 import json
 import re
 import time
 import http.cookiejar
+from concurrent.futures import Future, ThreadPoolExecutor
+from operator import itemgetter
 
-import dateparser
 import requests
 
+from .batches import column_batches, comment_batches
+from .bootstrap import extract_bootstrap, iter_text
+from .community import extract_post, post_renderer
+from .faststart import comment_endpoint, url_video_id
+from .pacing import RateLimiter
+from .record import FIELDS, Comment, check_fields
+from .stats import DownloadStats
+from .timeparse import TimeParser
+from .transport import USER_AGENT, Transport
+
 # Debugging Imports
 import sys
 import types
@@ -16,8 +28,7 @@ import http.cookiejar
 YOUTUBE_VIDEO_URL = 'https://www.youtube.com/watch?v={youtube_id}'
 YOUTUBE_CONSENT_URL = 'https://consent.youtube.com/save'
 YOUTUBE_COMMUNITY_URL = 'https://www.youtube.com/@{community}/community'
-
-USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/79.0.3945.130 Safari/537.36'
+YOUTUBE_POST_URL = 'https://www.youtube.com/post/{post_id}'
 
 SORT_BY_POPULAR = 0
 SORT_BY_RECENT = 1
@@ -26,13 +37,52 @@ YT_CFG_RE = r'ytcfg\.set\s*\(\s*({.+?})\s*\)\s*;'
 YT_INITIAL_DATA_RE = r'(?:window\s*\[\s*["\']ytInitialData["\']\s*\]|ytInitialData)\s*=\s*({.+?})\s*;\s*(?:var\s+meta|</script|\n)'
 YT_HIDDEN_INPUT_RE = r'<input\s+type="hidden"\s+name="([A-Za-z0-9_]+)"\s+value="([A-Za-z0-9_\-\.]*)"\s*(?:required|)\s*>'
 
+# Keys collected from every continuation response in a single pass (see index_dict)
+COMMENT_PAGE_KEYS = ('externalErrorMessage', 'reloadContinuationItemsCommand', 'appendContinuationItemsAction',
+                     'commentSurfaceEntityPayload', 'commentViewModel', 'engagementToolbarStateEntityPayload',
+                     'commentEntityPayload')
+COMMUNITY_PAGE_KEYS = ('externalErrorMessage', 'reloadContinuationItemsCommand', 'appendContinuationItemsAction')
+
+# How each plain field is read from a commentEntityPayload (heart, time_parsed and paid need more context)
+FIELD_GETTERS = {'cid': lambda comment: comment['properties']['commentId'],
+                 'text': lambda comment: comment['properties']['content']['content'],
+                 'time': lambda comment: comment['properties']['publishedTime'],
+                 'author': lambda comment: comment['author']['displayName'],
+                 'channel': lambda comment: comment['author']['channelId'],
+                 'votes': lambda comment: comment['toolbar']['likeCountNotliked'].strip() or "0",
+                 'replies': lambda comment: comment['toolbar']['replyCount'],
+                 'photo': lambda comment: comment['author']['avatarThumbnailUrl'],
+                 'reply': lambda comment: '.' in comment['properties']['commentId']}
+# The fields of FIELD_GETTERS that are a plain value of one part of the payload, for extract_columns
+COLUMN_SOURCES = {'cid': ('properties', 'commentId'), 'time': ('properties', 'publishedTime'),
+                  'author': ('author', 'displayName'), 'channel': ('author', 'channelId'),
+                  'replies': ('toolbar', 'replyCount'), 'photo': ('author', 'avatarThumbnailUrl')}
+# Fields the incremental mode and the reply limit rely on, extracted even when they are not requested
+REQUIRED_FIELDS = ('cid', 'replies', 'reply')
+REPLIES_TARGET_PREFIX = 'comment-replies-item-'
+# Responses containing these are errors (even with status 200), which are never cached
+ERROR_MARKERS = (b'externalErrorMessage', b'"alerts"')
+
 
 class YoutubeCommentDownloader:
 
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers['User-Agent'] = USER_AGENT
-        self.session.cookies.set('CONSENT', 'YES+cb', domain='.youtube.com')
+    def __init__(self, rate_limiter=None, stats=None, transport=None, cache=None):
+        # Paces every request made by this downloader, including those made by worker threads
+        self.rate_limiter = rate_limiter or RateLimiter()
+        # Latency, size and outcome of every request and the time spent in each stage of every page
+        self.stats = stats or DownloadStats()
+        # Session, connection pool, compression and JSON decoding
+        self.transport = transport or Transport()
+        # Optional responsecache.ResponseCache, which answers the requests it has seen before
+        self.cache = cache
+
+    @property
+    def session(self):
+        return self.transport.session
+
+    @session.setter
+    def session(self, session):
+        self.transport.session = session
 
     def use_cookies(self, cookie_file, cookie_useragent):
         cookiejar = http.cookiejar.MozillaCookieJar(cookie_file)
@@ -47,57 +97,224 @@ class YoutubeCommentDownloader:
             sys.stdout.write(f"Error loading cookies: {e}          \r")
             sys.stdout.flush()
 
-    def ajax_request(self, endpoint, ytcfg, retries=5, sleep=20, timeout=60):
+    def get_page(self, url, stream=False):
+        self.rate_limiter.acquire()
+        response = self.session.get(url, stream=stream)
+        if 'consent' in str(response.url):
+            # We may get redirected to a separate page for cookie consent. If this happens we agree automatically.
+            params = dict(re.findall(YT_HIDDEN_INPUT_RE, response.text))
+            params.update({'continue': url, 'set_eom': False, 'set_ytc': True, 'set_apyt': True})
+            self.rate_limiter.acquire()
+            response = self.session.post(YOUTUBE_CONSENT_URL, params=params, stream=stream)
+        return response
+
+    def fetch_bootstrap(self, url, debug=None):
+        # Return the (ytcfg, ytInitialData) of a watch or community page, from the response cache when possible
+        if self.cache is None:
+            return self.download_bootstrap(url, debug)
+        key = self.cache.key(url)
+        cached = self.cache.get_json(key, self.transport.loads)
+        if cached is not None:
+            return tuple(cached)
+        if self.cache.offline:
+            raise RuntimeError('Not in the response cache (offline mode): ' + url)
+        ytcfg, data = self.download_bootstrap(url, debug)
+        if ytcfg:
+            self.cache.put_json(key, [ytcfg, data])
+        return ytcfg, data
+
+    def download_bootstrap(self, url, debug=None):
+        # Download a watch or community page and return its (ytcfg, ytInitialData). The page is streamed and the
+        # connection is closed as soon as both objects have been decoded, unless the page is needed for debugging.
+        response = self.get_page(url, stream=True)
+        try:
+            if debug:
+                html = response.text
+                if isinstance(debug, str):
+                    with open(f"{debug}/ytResponse.html", "w", encoding='utf-8') as file:
+                        file.write(html)
+                else:
+                    debug.record('ytResponse.html', html, url=url)
+                return extract_bootstrap([html])
+            return extract_bootstrap(iter_text(response))
+        finally:
+            response.close()
+            self.transport.received(response)
+
+    def ajax_request(self, endpoint, ytcfg, retries=5, sleep=None, timeout=60, pause=None):
+        # Requests are paced by the rate limiter, and preceded by a `pause` of that many seconds when given (but
+        # not when the response comes from the cache). Failed requests are retried after a backoff, which starts
+        # at `sleep` seconds when given and at the rate limiter's default otherwise.
         url = 'https://www.youtube.com' + endpoint['commandMetadata']['webCommandMetadata']['apiUrl']
 
         data = {'context': ytcfg['INNERTUBE_CONTEXT'],
                 'continuation': endpoint['continuationCommand']['token']}
 
-        for _ in range(retries):
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(url, data['continuation'], data['context'])
+            cached = self.cache.get(key)
+            if cached is not None:
+                with self.stats.timer('decode'):
+                    return self.transport.loads(cached)
+            if self.cache.offline:
+                raise RuntimeError('Not in the response cache (offline mode): ' + url)
+
+        if pause:
+            time.sleep(pause)
+        for attempt in range(retries):
+            self.rate_limiter.acquire()
+            start_time = time.perf_counter()
             try:
                 response = self.session.post(url, params={'key': ytcfg['INNERTUBE_API_KEY']}, json=data, timeout=timeout)
+                latency = time.perf_counter() - start_time
+                self.stats.request(response.status_code, latency, len(response.content), attempt)
+                self.transport.received(response, len(response.content))
                 if response.status_code == 200:
-                    return response.json()
-                if response.status_code in [403, 413]:
+                    self.rate_limiter.success()
+                    if key and not any(marker in response.content for marker in ERROR_MARKERS):
+                        self.cache.put(key, response.content)
+                    with self.stats.timer('decode'):
+                        return self.transport.decode(response)
+                if response.status_code in [400, 403, 413]:
                     return {}
+                throttled = response.status_code == 429 or response.status_code >= 500
+                retry_after = response.headers.get('Retry-After')
             except requests.exceptions.Timeout:
-                pass
-            time.sleep(sleep)
+                self.stats.request('timeout', time.perf_counter() - start_time, 0, attempt)
+                throttled, retry_after = True, None
+            self.rate_limiter.failure(attempt, retry_after, throttled, backoff=sleep)
 
-    def get_comments(self, youtube_id, debug, *args, **kwargs):
+    def get_comments(self, youtube_id, debug=None, *args, **kwargs):
         return self.get_comments_from_url(YOUTUBE_VIDEO_URL.format(youtube_id=youtube_id), debug, *args, **kwargs)
 
-    def get_comments_from_url(self, youtube_url, debug=None, sort_by=SORT_BY_RECENT, language=None, sleep=.1):
-        response = self.session.get(youtube_url)
-
-        if 'consent' in str(response.url):
-            # We may get redirected to a separate page for cookie consent. If this happens we agree automatically.
-            params = dict(re.findall(YT_HIDDEN_INPUT_RE, response.text))
-            params.update({'continue': youtube_url, 'set_eom': False, 'set_ytc': True, 'set_apyt': True})
-            response = self.session.post(YOUTUBE_CONSENT_URL, params=params)
-
-        html = response.text
-        if debug:
-            with open(f"{debug}/ytResponse.html", "w", encoding='utf-8') as file:
-                file.write(html)
+    def get_comment_batches(self, youtube_id, debug=None, *args, **kwargs):
+        return self.get_comment_batches_from_url(YOUTUBE_VIDEO_URL.format(youtube_id=youtube_id), debug, *args,
+                                                 **kwargs)
+
+    def get_comment_batches_from_url(self, youtube_url, debug=None, *args, batch_size=1000, format='dict',
+                                     **kwargs):
+        # Yields the comments in columnar batches of up to `batch_size` comments (see batches.comment_batches),
+        # with vote and reply counts as ints and time_parsed as int seconds. Takes the options of
+        # get_comments_from_url.
+        fields = check_fields(kwargs.get('fields')) or FIELDS
+        if not kwargs.get('parse_time', True):
+            fields = tuple(field for field in fields if field != 'time_parsed')
+        if kwargs.get('seen') is not None or kwargs.get('max_replies'):
+            # These drop individual comments, so they need a record per comment
+            comments = self.get_comments_from_url(youtube_url, debug, *args, **kwargs)
+            batches = comment_batches(comments, batch_size, fields, format)
+        else:
+            kwargs['fields'] = fields
+            comments = self.get_comments_from_url(youtube_url, debug, *args, columns=True, **kwargs)
+            batches = column_batches(comments, batch_size, format)
+        try:
+            yield from batches
+        finally:
+            comments.close()
+
+    def prefetch_replies(self, executor, prefetched, continuation, ytcfg, chain=True):
+        # Fetch a reply continuation in the background. The result is stored under id(continuation), so the
+        # main loop picks it up when it pops that same endpoint from its stack.
+        def fetch():
+            response = self.ajax_request(continuation, ytcfg)
+            if not chain:
+                return response
+            # The 'Show more replies' page of this thread is the next one the main loop will ask for
+            for action in self.index_dict(response or {}, ['appendContinuationItemsAction'])['appendContinuationItemsAction']:
+                for command in self.reply_commands(action):
+                    self.prefetch_replies(executor, prefetched, command, ytcfg)
+            return response
 
-        ytcfg = json.loads(self.regex_search(html, YT_CFG_RE, default=''))
+        try:
+            prefetched[id(continuation)] = executor.submit(fetch)
+        except RuntimeError:
+            pass  # Executor has been shut down, the generator was closed
+
+    def reply_commands(self, action):
+        if action.get('targetId', '').startswith(REPLIES_TARGET_PREFIX):
+            for item in action.get('continuationItems', []):
+                if 'continuationItemRenderer' in item:
+                    yield next(self.search_dict(item, 'buttonRenderer'))['command']
+
+    def get_comments_from_url(self, youtube_url, debug=None, sort_by=SORT_BY_RECENT, language=None, sleep=None,
+                              reply_workers=None, checkpoint=None, parse_time=True, seen=None, ytcfg_cache=None,
+                              fields=None, compact=False, max_replies=None, max_requests=None, columns=False):
+        # fields: only extract these fields (see record.FIELDS), compact: yield record.Comment objects
+        # columns: yield a dict of lists per page instead (see extract_columns), without seen or max_replies
+        # max_replies: replies per thread (0 for none), max_requests: stop after this many continuation requests
+        fields = check_fields(fields)
+        if seen is not None:
+            sort_by = SORT_BY_RECENT  # Incremental downloads rely on new comments coming first
+        emitted = 0
+        first_page = None
+        if checkpoint and checkpoint.resumes(youtube_url):
+            # Resume from the saved frontier, skipping the watch page altogether
+            ytcfg = checkpoint.state['ytcfg']
+            continuations = checkpoint.state['continuations']
+            emitted = checkpoint.state['emitted']
+        else:
+            ytcfg, continuations = None, None
+            if ytcfg_cache is not None:
+                with self.stats.timer('bootstrap'):
+                    ytcfg, continuations, first_page = self.fast_start(youtube_url, ytcfg_cache, sort_by, language)
+            if not continuations:
+                with self.stats.timer('bootstrap'):
+                    ytcfg, continuations = self.bootstrap_comments(youtube_url, debug, sort_by, language)
+                if not continuations:
+                    # Not the same as a video without comments, which still has a (first) comment page
+                    raise RuntimeError('Unable to extract the Youtube configuration from ' + youtube_url)
+                if ytcfg_cache is not None:
+                    ytcfg_cache.put(ytcfg)
+            if checkpoint:
+                checkpoint.start(youtube_url, ytcfg, continuations[0])
+
+        # Reply threads are independent of each other, so they can optionally be fetched by a pool of workers.
+        # Comments are still yielded in the same order as when fetching serially.
+        executor = ThreadPoolExecutor(max_workers=reply_workers) if reply_workers else None
+        prefetched = {}
+        if first_page is not None:
+            # The first page was already downloaded by fast_start, hand it to the crawler like a prefetched page
+            prefetched[id(continuations[0])] = Future()
+            prefetched[id(continuations[0])].set_result(first_page)
+        try:
+            yield from self.crawl_comments(continuations, ytcfg, debug, sleep, executor, prefetched,
+                                           checkpoint, emitted, parse_time, seen, fields, compact, max_replies,
+                                           max_requests, columns)
+        finally:
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def fast_start(self, youtube_url, ytcfg_cache, sort_by, language):
+        # Request the first comment page with a cached ytcfg and a synthesized continuation token, skipping the
+        # watch page. Returns (ytcfg, continuations, first page), or Nones when the HTML path should be used.
+        youtube_id = url_video_id(youtube_url)
+        ytcfg = ytcfg_cache.get(language) if youtube_id else None
         if not ytcfg:
-            return  # Unable to extract configuration
+            return None, None, None
+        endpoint = comment_endpoint(youtube_id, sort_by)
+        response = self.ajax_request(endpoint, ytcfg, retries=1)
+        index = self.index_dict(response or {}, ['reloadContinuationItemsCommand', 'appendContinuationItemsAction'])
+        if not any(index.values()):
+            return None, None, None  # The token was rejected
+        return ytcfg, [endpoint], response
+
+    def bootstrap_comments(self, youtube_url, debug, sort_by, language):
+        ytcfg, data = self.fetch_bootstrap(youtube_url, debug)
+        if not ytcfg:
+            return None, None  # Unable to extract configuration
         else:
-            self.debug_log(debug, "ytcfg.json", ytcfg)
+            self.debug_log(debug, 'ytcfg', ytcfg)
         if language:
             ytcfg['INNERTUBE_CONTEXT']['client']['hl'] = language
 
-        data = json.loads(self.regex_search(html, YT_INITIAL_DATA_RE, default=''))
-        self.debug_log(debug, "ytInitialData.json", data)
+        data = data or {}
+        self.debug_log(debug, 'ytInitialData', data)
         # Old code:
         #item_section = next(self.search_dict(data, 'itemSectionRenderer'), None)
         item_section = self.search_dict(data, 'itemSectionRenderer')
-        item_count = 0
-        for item in item_section:
-            self.debug_log(debug, f"item_{item_count}.json", item)
-            item_count += 1
+        for item_count, item in enumerate(item_section):
+            self.debug_log(debug, 'item', item, item=item_count)
             if "targetId" in item and "sectionIdentifier" in item:
                 if item['targetId'] == "engagement-panel-comments-section" and item['sectionIdentifier'] == "comment-item-section":
                     item_section = item
@@ -107,11 +324,11 @@ class YoutubeCommentDownloader:
         #renderer = next(self.search_dict(item_section, 'continuationItemRenderer'), None) if item_section else None
 
         if item_section:
-            self.debug_log(debug, "itemSection.json", item_section) 
+            self.debug_log(debug, 'itemSection', item_section)
             renderer = self.search_dict(item_section, 'continuationItemRenderer')
             renderer_count = 0
             for render in renderer:
-                self.debug_log(debug, f"rendererData_{renderer_count}.json", render) 
+                self.debug_log(debug, 'rendererData', render, item=renderer_count)
                 renderer_count += 1
                 if "sectionIdentifier" in render and "targetId" in render:
                     if render["sectionIdentifier"] == "comment-item-section" and render["targetId"] == "engagement-panel-comments-section":
@@ -121,20 +338,18 @@ class YoutubeCommentDownloader:
                 # Comments disabled? Or attempt to find a coment renderer...
                 renderer = self.search_dict(data, 'commentsEntryPointHeaderRenderer')
                 for render in renderer:
-                    self.debug_log(debug, f"renderer_{renderer_count}.json", render)
+                    self.debug_log(debug, 'renderer', render, item=renderer_count)
                     renderer_count += 1
                 if not renderer:
                     sys.stdout.write(f"No comment renderer could be found?          \r")
                     sys.stdout.flush()
-                    return
+                    return None, None
         # Old code:
         # sort_menu = next(self.search_dict(data, 'sortFilterSubMenuRenderer'), {}).get('subMenuItems', [])
         sort_menu = self.search_dict(data.get('engagementPanels', []), 'sortFilterSubMenuRenderer')
-        menu_count = 0
-        for menu in sort_menu:
+        for menu_count, menu in enumerate(sort_menu):
             submenu = menu.get('subMenuItems', [])
-            self.debug_log(debug, f"sortMenuData_{menu_count}.json", submenu)
-            menu_count += 1
+            self.debug_log(debug, 'sortMenuData', submenu, item=menu_count)
             if "title" in submenu[0]:
                 if submenu[0]["title"] == "Top comments":
                     sort_menu = submenu
@@ -152,148 +367,418 @@ class YoutubeCommentDownloader:
         if not sort_menu or sort_by >= len(sort_menu):
             raise RuntimeError('Failed to set sorting')
         continuations = [sort_menu[sort_by]['serviceEndpoint']]
-        self.debug_log(debug, "continuations.json", continuations)
-
+        self.debug_log(debug, 'continuations', list(continuations))
+        return ytcfg, continuations
+
+    def crawl_comments(self, continuations, ytcfg, debug, sleep, executor, prefetched, checkpoint=None, emitted=0,
+                       parse_time=True, seen=None, fields=None, compact=False, max_replies=None, max_requests=None,
+                       columns=False):
+        language = ytcfg.get('INNERTUBE_CONTEXT', {}).get('client', {}).get('hl')
+        time_parser = TimeParser(language) if parse_time else None
+        extracted = fields
+        if fields is not None and (seen is not None or max_replies) and not set(REQUIRED_FIELDS) <= set(fields):
+            extracted = fields + tuple(field for field in REQUIRED_FIELDS if field not in fields)
+        # Reply pages are only prefetched one at a time when the number of requests matters
+        chain = max_replies is None and max_requests is None
+        reply_totals = {}
+        requests = 0
         continuation_count = 0
-        while continuations:
-            continuation = continuations.pop()
-            self.debug_log(debug, f"continuationData_{continuation_count}.json", continuation)
-            response = self.ajax_request(continuation, ytcfg)
-            self.debug_log(debug, f"continuationResponse_{continuation_count}.json", response)
-
-            if not response:
-                break
+        page = -1
+        finished = False
+        crawl = seen.begin() if seen is not None else None
+        try:
+            while continuations:
+                if checkpoint:
+                    checkpoint.update(continuations, emitted + continuation_count)
+                continuation = continuations.pop()
+                future = prefetched.pop(id(continuation), None)
+                if not future and max_requests is not None and requests >= max_requests:
+                    # Out of budget, the remaining frontier stays in the checkpoint
+                    continuations.append(continuation)
+                    self.stats.avoid(sum(id(endpoint) not in prefetched for endpoint in continuations))
+                    break
+                requests += not future
+                page += 1
+                self.debug_log(debug, 'continuationData', continuation, page=page)
+                response = future.result() if future else self.ajax_request(continuation, ytcfg, pause=sleep)
+                self.debug_log(debug, 'continuationResponse', response, page=page)
 
-            error = next(self.search_dict(response, 'externalErrorMessage'), None)
-            if error:
-                raise RuntimeError('Error returned from server: ' + error)
+                if not response:
+                    break
 
-            actions = list(self.search_dict(response, 'reloadContinuationItemsCommand')) + \
-                      list(self.search_dict(response, 'appendContinuationItemsAction'))
-            if debug:
-                sys.stdout.write(f"Actions to take: {len(actions)}          \r")
-                sys.stdout.flush()
-                time.sleep(1)
-            for action in actions:
-                for item in action.get('continuationItems', []):
-                    self.debug_log(debug, f"{continuation_count}_action_{actions.index(action)}_Item_{action.get('continuationItems', []).index(item)}.json", item)
-                    if action['targetId'] in ['comments-section',
-                                              'engagement-panel-comments-section',
-                                              'shorts-engagement-panel-comments-section']:
-                        # Process continuations for comments and replies.
-                        continuations[:0] = [ep for ep in self.search_dict(item, 'continuationEndpoint')]
-                    if action['targetId'].startswith('comment-replies-item') and 'continuationItemRenderer' in item:
-                        # Process the 'Show more replies' button
-                        continuations.append(next(self.search_dict(item, 'buttonRenderer'))['command'])
-
-            surface_payloads = self.search_dict(response, 'commentSurfaceEntityPayload')
-            payments = {payload['key']: next(self.search_dict(payload, 'simpleText'), '')
-                        for payload in surface_payloads if 'pdgCommentChip' in payload}
-            if payments:
-                # We need to map the payload keys to the comment IDs.
-                view_models = [vm['commentViewModel'] for vm in self.search_dict(response, 'commentViewModel')]
-                surface_keys = {vm['commentSurfaceKey']: vm['commentId']
-                                for vm in view_models if 'commentSurfaceKey' in vm}
-                payments = {surface_keys[key]: payment for key, payment in payments.items() if key in surface_keys}
-
-            toolbar_payloads = self.search_dict(response, 'engagementToolbarStateEntityPayload')
-            toolbar_states = {payload['key']: payload for payload in toolbar_payloads}
-            for comment in reversed(list(self.search_dict(response, 'commentEntityPayload'))):
-                properties = comment['properties']
-                cid = properties['commentId']
-                author = comment['author']
-                toolbar = comment['toolbar']
-                toolbar_state = toolbar_states[properties['toolbarStateKey']]
-                result = {'cid': cid,
-                          'text': properties['content']['content'],
-                          'time': properties['publishedTime'],
-                          'author': author['displayName'],
-                          'channel': author['channelId'],
-                          'votes': toolbar['likeCountNotliked'].strip() or "0",
-                          'replies': toolbar['replyCount'],
-                          'photo': author['avatarThumbnailUrl'],
-                          'heart': toolbar_state.get('heartState', '') == 'TOOLBAR_HEART_STATE_HEARTED',
-                          'reply': '.' in cid}
-
-                try:
-                    result['time_parsed'] = dateparser.parse(result['time'].split('(')[0].strip()).timestamp()
-                except AttributeError:
-                    pass
-
-                if cid in payments:
-                    result['paid'] = payments[cid]
-
-                continuation_count += 1
-                yield result
-            time.sleep(sleep)
-
-    def get_community(self, community, debug, *args, **kwargs):
-        return self.get_community_from_url(YOUTUBE_COMMUNITY_URL.format(community=f"{community[1:] if community.startswith('@') else community}"), debug, *args, **kwargs)
+                start_time = time.perf_counter()
+                index = self.index_dict(response, COMMENT_PAGE_KEYS)
+                index_time = time.perf_counter()
+                self.stats.add('index', index_time - start_time)
+                error = next(iter(index['externalErrorMessage']), None)
+                if error:
+                    raise RuntimeError('Error returned from server: ' + error)
+
+                actions = index['reloadContinuationItemsCommand'] + index['appendContinuationItemsAction']
+                if columns:
+                    comments = self.extract_columns(index, time_parser, fields or FIELDS)
+                    count = len(index['commentEntityPayload'])
+                else:
+                    comments = self.extract_comments(index, time_parser, extracted, compact)
+                    count = len(comments)
+                page_time = time.perf_counter() - start_time
+                self.stats.add('extract', page_time - (index_time - start_time))
+                self.stats.page(count, page_time)
+                if max_replies:
+                    comments = self.limit_replies(comments, reply_totals, max_replies)
+                known, reply_counts, exhausted = {}, {}, False
+                if seen is not None:
+                    with self.stats.timer('seen'):
+                        known = seen.lookup([comment['cid'] for comment in comments])
+                    # Paging stops at the first page that only has comments we have seen before
+                    reply_counts = {comment['cid']: comment['replies'] for comment in comments if not comment['reply']}
+                    exhausted = bool(known) and all(cid in known for cid in reply_counts)
+                    seen.stage(crawl, comments)
+
+                for action_count, action in enumerate(actions):
+                    for item_count, item in enumerate(action.get('continuationItems', [])):
+                        self.debug_log(debug, 'actionItem', item, page=page, action=action_count, item=item_count)
+                        if action['targetId'] in ['comments-section',
+                                                  'engagement-panel-comments-section',
+                                                  'shorts-engagement-panel-comments-section']:
+                            if 'commentThreadRenderer' in item:
+                                cid = self.thread_comment_id(item)
+                                if cid in known and known[cid] == reply_counts.get(cid):
+                                    continue  # Known thread without new replies
+                            elif exhausted:
+                                continue
+                            # Process continuations for comments and replies.
+                            endpoints = [ep for ep in self.search_dict(item, 'continuationEndpoint')]
+                            if max_replies == 0 and 'commentThreadRenderer' in item:
+                                self.stats.avoid(len(endpoints))
+                                continue
+                            continuations[:0] = endpoints
+                            if executor and 'commentThreadRenderer' in item:
+                                for endpoint in endpoints:
+                                    if max_requests is not None and requests >= max_requests:
+                                        break
+                                    requests += 1
+                                    self.prefetch_replies(executor, prefetched, endpoint, ytcfg, chain)
+                    # Process the 'Show more replies' button
+                    commands = list(self.reply_commands(action))
+                    if commands and max_replies is not None:
+                        thread = action['targetId'][len(REPLIES_TARGET_PREFIX):]
+                        if reply_totals.get(thread, 0) >= max_replies:
+                            self.stats.avoid(len(commands))
+                            continue
+                    continuations.extend(commands)
+
+                if columns:
+                    if count:
+                        continuation_count += count
+                        yield comments
+                    continue
+                for result in comments:
+                    if result['cid'] in known:
+                        continue
+                    continuation_count += 1
+                    yield result if extracted is fields else self.project(result, fields)
+            else:
+                finished = True
+        finally:
+            if seen is not None:
+                # Only a crawl that went all the way makes its comments known, see SeenStore
+                if finished:
+                    seen.promote(crawl)
+                else:
+                    seen.discard(crawl)
+            if checkpoint and checkpoint.state:
+                if finished:
+                    checkpoint.clear()
+                else:
+                    # Interrupted or stopped early, keep the frontier from before the current page
+                    checkpoint.save()
+
+    def extract_comments(self, index, time_parser=None, fields=None, compact=False):
+        if fields is not None:
+            return self.extract_fields(index, time_parser, fields, compact)
+        reference = time.time()
+        payments = self.payments(index)
+        toolbar_payloads = index['engagementToolbarStateEntityPayload']
+        toolbar_states = {payload['key']: payload for payload in toolbar_payloads}
+        comments = []
+        parse_time = 0.0
+        for comment in reversed(index['commentEntityPayload']):
+            properties = comment['properties']
+            cid = properties['commentId']
+            author = comment['author']
+            toolbar = comment['toolbar']
+            toolbar_state = toolbar_states[properties['toolbarStateKey']]
+            result = {'cid': cid,
+                      'text': properties['content']['content'],
+                      'time': properties['publishedTime'],
+                      'author': author['displayName'],
+                      'channel': author['channelId'],
+                      'votes': toolbar['likeCountNotliked'].strip() or "0",
+                      'replies': toolbar['replyCount'],
+                      'photo': author['avatarThumbnailUrl'],
+                      'heart': toolbar_state.get('heartState', '') == 'TOOLBAR_HEART_STATE_HEARTED',
+                      'reply': '.' in cid}
+
+            if compact:
+                comments.append(Comment(**result, paid=payments.get(cid), time_parser=time_parser, reference=reference))
+                continue
+            if time_parser:
+                start_time = time.perf_counter()
+                time_parsed = time_parser.parse(result['time'], reference)
+                parse_time += time.perf_counter() - start_time
+                if time_parsed is not None:
+                    result['time_parsed'] = time_parsed
+
+            if cid in payments:
+                result['paid'] = payments[cid]
+            comments.append(result)
+        if parse_time:
+            self.stats.add('time_parse', parse_time)
+        return comments
+
+    def extract_fields(self, index, time_parser, fields, compact=False):
+        # Like extract_comments, but only does the work for the requested fields. Compact records parse their
+        # time when it is first used.
+        getters = [(field, FIELD_GETTERS[field]) for field in fields if field in FIELD_GETTERS]
+        payments = self.payments(index) if 'paid' in fields else {}
+        heart = 'heart' in fields
+        toolbar_states = {}
+        if heart:
+            toolbar_states = {payload['key']: payload for payload in index['engagementToolbarStateEntityPayload']}
+        time_parser = time_parser if 'time_parsed' in fields else None
+        reference = time.time()
+        comments = []
+        parse_time = 0.0
+        for comment in reversed(index['commentEntityPayload']):
+            result = {field: getter(comment) for field, getter in getters}
+            if heart:
+                toolbar_state = toolbar_states[comment['properties']['toolbarStateKey']]
+                result['heart'] = toolbar_state.get('heartState', '') == 'TOOLBAR_HEART_STATE_HEARTED'
+            if payments and comment['properties']['commentId'] in payments:
+                result['paid'] = payments[comment['properties']['commentId']]
+
+            if compact:
+                time_text = comment['properties']['publishedTime'] if time_parser else None
+                comments.append(Comment(**result, time_parser=time_parser, reference=reference, time_text=time_text))
+                continue
+            if time_parser:
+                start_time = time.perf_counter()
+                time_parsed = time_parser.parse(comment['properties']['publishedTime'], reference)
+                parse_time += time.perf_counter() - start_time
+                if time_parsed is not None:
+                    result['time_parsed'] = time_parsed
+            comments.append({field: result[field] for field in fields if field in result})
+        if parse_time:
+            self.stats.add('time_parse', parse_time)
+        return comments
+
+    def extract_columns(self, index, time_parser, fields):
+        # Like extract_fields, but builds a list per field instead of a record per comment. Missing values
+        # (paid, time_parsed) are None.
+        payloads = index['commentEntityPayload'][::-1]
+        parts = {part: list(map(itemgetter(part), payloads)) for part in ('properties', 'author', 'toolbar')}
+        columns = {}
+        for field in fields:
+            if field in COLUMN_SOURCES:
+                part, key = COLUMN_SOURCES[field]
+                columns[field] = list(map(itemgetter(key), parts[part]))
+            elif field == 'text':
+                columns[field] = [properties['content']['content'] for properties in parts['properties']]
+            elif field == 'votes':
+                columns[field] = [toolbar['likeCountNotliked'].strip() or '0' for toolbar in parts['toolbar']]
+            elif field == 'reply':
+                columns[field] = ['.' in properties['commentId'] for properties in parts['properties']]
+            elif field == 'heart':
+                toolbar_states = {payload['key']: payload for payload in index['engagementToolbarStateEntityPayload']}
+                columns[field] = [toolbar_states[properties['toolbarStateKey']].get('heartState', '') ==
+                                  'TOOLBAR_HEART_STATE_HEARTED' for properties in parts['properties']]
+            elif field == 'paid':
+                payments = self.payments(index)
+                columns[field] = [payments.get(properties['commentId']) for properties in parts['properties']]
+            elif field == 'time_parsed' and time_parser:
+                reference = time.time()
+                with self.stats.timer('time_parse'):
+                    columns[field] = [time_parser.parse(properties['publishedTime'], reference)
+                                      for properties in parts['properties']]
+            else:
+                columns[field] = [None] * len(payloads)
+        return columns
+
+    def payments(self, index):
+        # Paid chip text by comment ID
+        surface_payloads = index['commentSurfaceEntityPayload']
+        payments = {payload['key']: next(self.search_dict(payload, 'simpleText'), '')
+                    for payload in surface_payloads if 'pdgCommentChip' in payload}
+        if payments:
+            # We need to map the payload keys to the comment IDs.
+            view_models = [vm['commentViewModel'] for vm in index['commentViewModel']]
+            surface_keys = {vm['commentSurfaceKey']: vm['commentId']
+                            for vm in view_models if 'commentSurfaceKey' in vm}
+            payments = {surface_keys[key]: payment for key, payment in payments.items() if key in surface_keys}
+        return payments
 
-    def get_community_from_url(self, community_url, debug=None, sort_by=SORT_BY_RECENT, language=None, sleep=.1):
-        response = self.session.get(community_url)
-        if 'consent' in str(response.url):
-            # We may get redirected to a separate page for cookie consent. If this happens we agree automatically.
-            params = dict(re.findall(YT_HIDDEN_INPUT_RE, response.text))
-            params.update({'continue': community_url, 'set_eom': False, 'set_ytc': True, 'set_apyt': True})
-            response = self.session.post(YOUTUBE_CONSENT_URL, params=params)
+    @staticmethod
+    def limit_replies(comments, reply_totals, max_replies):
+        # Keep at most `max_replies` replies per thread, `reply_totals` counts the replies of each thread so far
+        kept = []
+        for comment in comments:
+            if comment['reply']:
+                thread = comment['cid'].split('.')[0]
+                reply_totals[thread] = reply_totals.get(thread, 0) + 1
+                if reply_totals[thread] > max_replies:
+                    continue
+            kept.append(comment)
+        return kept
 
-        html = response.text
-        if debug:
-            soup = BeautifulSoup(response.content, 'html.parser', from_encoding="utf8")
-            with open(f"{debug}/ytResponse.html", "w", encoding='utf-8') as file:
-                file.write(str(soup.prettify()))
+    @staticmethod
+    def project(comment, fields):
+        # Drop the fields that were only extracted for the incremental mode or the reply limit
+        if isinstance(comment, Comment):
+            for field in REQUIRED_FIELDS:
+                if field not in fields:
+                    setattr(comment, field, None)
+            return comment
+        return {field: comment[field] for field in fields if field in comment}
+
+    def thread_comment_id(self, item):
+        view_model = item['commentThreadRenderer'].get('commentViewModel', {})
+        return next(self.search_dict(view_model, 'commentId'), None)
+
+    def get_community(self, community, debug=None, *args, **kwargs):
+        return self.get_community_from_url(YOUTUBE_COMMUNITY_URL.format(community=f"{community[1:] if community.startswith('@') else community}"), debug, *args, **kwargs)
 
-        ytcfg = json.loads(self.regex_search(html, YT_CFG_RE, default=''))
+    def get_community_from_url(self, community_url, debug=None, sort_by=SORT_BY_RECENT, language=None, sleep=None,
+                               comments=False, comment_workers=4, max_comments=None, **comment_options):
+        # Yields the posts of a community tab as dicts (see community.POST_FIELDS). With comments=True, the first
+        # `max_comments` comments of every post are added as a list under 'comments'. They are fetched on a pool
+        # of `comment_workers` threads, a page of posts at a time, and the posts are still yielded in order. When
+        # the comments of a post fail, its 'comments' are empty and 'comments_error' says why.
+        # comment_options (parse_time, fields, compact, max_replies, max_requests) apply to each post's comments.
+        ytcfg, data = self.fetch_bootstrap(community_url, debug)
         if not ytcfg:
             return  # Unable to extract configuration
-        self.debug_log(debug, "ytcfg.json", ytcfg)
+        self.debug_log(debug, 'ytcfg', ytcfg)
 
         if language:
             ytcfg['INNERTUBE_CONTEXT']['client']['hl'] = language
+        time_parser = TimeParser(ytcfg['INNERTUBE_CONTEXT']['client'].get('hl') or 'en')
 
-        data = json.loads(self.regex_search(html, YT_INITIAL_DATA_RE, default=''))
-        self.debug_log(debug, "ytInitialData.json", data)
+        data = data or {}
+        self.debug_log(debug, 'ytInitialData', data)
 
-        item_section = self.search_dict(data, 'itemSectionRenderer')
-        self.debug_log(debug, "itemSection.json", item_section)
-        for item in item_section:
+        item_section = None
+        for item_count, item in enumerate(self.search_dict(data, 'itemSectionRenderer')):
             if "sectionIdentifier" in item:
-                self.debug_log(debug, f"itemSection_{item_section.indexof(item)}.json", item)
+                self.debug_log(debug, 'itemSection', item, item=item_count)
                 if item['sectionIdentifier'] == "backstage-item-section":
                     item_section = item
-        renderer = next(self.search_dict(item_section, 'continuationItemRenderer'), None) if item_section else None
-        if not renderer:
-            # Comments disabled?
-            return
-
-        continuations = [renderer['continuationEndpoint']]
+                    break
+        if not item_section:
+            return  # No posts
 
-        continuation_count = 0
+        executor = ThreadPoolExecutor(max_workers=comment_workers) if comments else None
+        try:
+            for renderers in self.community_pages(item_section, ytcfg, debug, sleep):
+                posts = [extract_post(renderer, time_parser) for renderer in renderers]
+                if not executor:
+                    yield from posts
+                    continue
+                futures = [executor.submit(self.post_comments, post['pid'], debug, sort_by, language, max_comments,
+                                           comment_options) for post in posts]
+                for post, future in zip(posts, futures):
+                    try:
+                        post['comments'] = future.result()
+                    except Exception as e:
+                        # A post whose comments can't be downloaded should not cost the other posts
+                        post['comments'] = []
+                        post['comments_error'] = '%s: %s' % (type(e).__name__, e)
+                    yield post
+        finally:
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def community_pages(self, item_section, ytcfg, debug, sleep):
+        # Yields the post renderers of the community tab a page at a time, starting with the posts that are part of
+        # the initial data of the page
+        items = item_section.get('contents', [])
+        yield [renderer for renderer in map(post_renderer, items) if renderer]
+        continuations = [endpoint for item in items if 'continuationItemRenderer' in item
+                         for endpoint in self.search_dict(item, 'continuationEndpoint')]
+
+        page = -1
         while continuations:
             continuation = continuations.pop()
-            response = self.ajax_request(continuation, ytcfg)
+            page += 1
+            response = self.ajax_request(continuation, ytcfg, pause=sleep)
+            self.debug_log(debug, 'continuationResponse', response, page=page)
 
             if not response:
                 break
 
-            error = next(self.search_dict(response, 'externalErrorMessage'), None)
+            index = self.index_dict(response, COMMUNITY_PAGE_KEYS)
+            error = next(iter(index['externalErrorMessage']), None)
             if error:
                 raise RuntimeError('Error returned from server: ' + error)
 
-            actions = list(self.search_dict(response, 'reloadContinuationItemsCommand')) + \
-                      list(self.search_dict(response, 'appendContinuationItemsAction'))
-            for action in actions:
-                for item in action.get('continuationItems', []):
-                    self.debug_log(debug, f"{continuation_count}_action_{actions.index(action)}_Item_{action.get('continuationItems', []).index(item)}.json", item)
-                    if action['targetId']:
-                        # Process continuations for comments and replies.
+            renderers = []
+            actions = index['reloadContinuationItemsCommand'] + index['appendContinuationItemsAction']
+            for action_count, action in enumerate(actions):
+                for item_count, item in enumerate(action.get('continuationItems', [])):
+                    self.debug_log(debug, 'actionItem', item, page=page, action=action_count, item=item_count)
+                    renderer = post_renderer(item)
+                    if renderer:
+                        renderers.append(renderer)
+                    elif 'continuationItemRenderer' in item:
                         continuations[:0] = [ep for ep in self.search_dict(item, 'continuationEndpoint')]
+            yield renderers
+
+    def get_post_comments(self, post_id, debug=None, *args, **kwargs):
+        return self.get_post_comments_from_url(YOUTUBE_POST_URL.format(post_id=post_id), debug, *args, **kwargs)
+
+    def get_post_comments_from_url(self, post_url, debug=None, sort_by=SORT_BY_RECENT, language=None, sleep=None,
+                                   parse_time=True, fields=None, compact=False, max_replies=None, max_requests=None):
+        fields = check_fields(fields)
+        with self.stats.timer('bootstrap'):
+            ytcfg, continuations, first_page = self.bootstrap_post_comments(post_url, debug, sort_by, language)
+        if not continuations:
+            return
+        prefetched = {}
+        if first_page is not None:
+            prefetched[id(continuations[0])] = Future()
+            prefetched[id(continuations[0])].set_result(first_page)
+        yield from self.crawl_comments(continuations, ytcfg, debug, sleep, None, prefetched, parse_time=parse_time,
+                                       fields=fields, compact=compact, max_replies=max_replies,
+                                       max_requests=max_requests)
+
+    def post_comments(self, post_id, debug, sort_by, language, max_comments, comment_options):
+        comments = self.get_post_comments(post_id, debug, sort_by, language, **comment_options)
+        try:
+            return list(itertools.islice(comments, max_comments))
+        finally:
+            comments.close()
+
+    def bootstrap_post_comments(self, post_url, debug, sort_by, language):
+        ytcfg, data = self.fetch_bootstrap(post_url, debug)
+        if not ytcfg:
+            return None, None, None  # Unable to extract configuration
+        if language:
+            ytcfg['INNERTUBE_CONTEXT']['client']['hl'] = language
+
+        item_section = next((item for item in self.search_dict(data or {}, 'itemSectionRenderer')
+                             if item.get('sectionIdentifier') == 'comment-item-section'), {})
+        continuation = next(self.search_dict(item_section, 'continuationEndpoint'), None)
+        if not continuation:
+            return None, None, None  # Comments disabled
+
+        # Post pages have no sort menu, it comes with the first page of comments. That page is kept, unless it
+        # turns out to be sorted differently.
+        first_page = self.ajax_request(continuation, ytcfg)
+        sort_menu = next(self.search_dict(first_page or {}, 'sortFilterSubMenuRenderer'), {}).get('subMenuItems', [])
+        if sort_by < len(sort_menu) and not sort_menu[sort_by].get('selected'):
+            return ytcfg, [sort_menu[sort_by]['serviceEndpoint']], None
+        return ytcfg, [continuation], first_page
 
-                    # TODO: map the payload keys to posts?
-                    continuation_count += 1
-                    yield item
-            time.sleep(sleep)
     @staticmethod
     def regex_search(text, pattern, group=1, default=None):
         match = re.search(pattern, text)
@@ -312,8 +797,36 @@ class YoutubeCommentDownloader:
                         stack.append(value)
             elif isinstance(current_item, list):
                 stack.extend(current_item)
+
     @staticmethod
-    def debug_log(debug, file_name, json_data):
-        if debug:
+    def index_dict(partial, search_keys):
+        # Single pass equivalent of calling search_dict once per key. Each bucket holds the same values, in the
+        # same order, as list(search_dict(partial, key)). A subtree is only visited for the keys that have not
+        # matched on the path leading to it, and is skipped entirely once all keys have matched.
+        index = {key: [] for key in search_keys}
+        stack = [(partial, frozenset(search_keys))]
+        while stack:
+            current_item, keys = stack.pop()
+            if isinstance(current_item, dict):
+                for key, value in current_item.items():
+                    if key in keys:
+                        index[key].append(value)
+                        if len(keys) > 1 and isinstance(value, (dict, list)):
+                            stack.append((value, keys - {key}))
+                    elif isinstance(value, (dict, list)):
+                        stack.append((value, keys))
+            elif isinstance(current_item, list):
+                stack.extend((item, keys) for item in current_item)
+        return index
+
+    @staticmethod
+    def debug_log(debug, name, json_data, **keys):
+        # `debug` is a DebugArchive, or the directory to write a file per record to
+        if not debug:
+            return
+        if isinstance(debug, str):
+            file_name = name + ''.join(f"_{key}_{value}" for key, value in keys.items()) + '.json'
             with open(f"{debug}/{file_name}", 'w', encoding='utf-8') as f:
                 json.dump(json_data, f, ensure_ascii=False, indent=4)
+        else:
+            debug.record(name, json_data, **keys)
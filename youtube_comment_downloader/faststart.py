@@ -0,0 +1,102 @@
+import base64
+import io
+import json
+import os
+import re
+import threading
+import time
+
+YT_VIDEO_ID_RE = r'(?:v=|youtu\.be/|shorts/|embed/|live/)([A-Za-z0-9_-]{11})'
+
+NEXT_API_URL = '/youtubei/v1/next'
+
+# Only these ytcfg entries are needed to request continuation pages
+YTCFG_KEYS = ('INNERTUBE_API_KEY', 'INNERTUBE_CONTEXT')
+
+
+def encode_varint(value):
+    data = bytearray()
+    while value > 0x7f:
+        data.append(value & 0x7f | 0x80)
+        value >>= 7
+    data.append(value)
+    return bytes(data)
+
+
+def encode_message(fields):
+    # Minimal protobuf encoder for a list of (field number, value) pairs. Integers are encoded as varints,
+    # strings, bytes and nested lists of pairs as length delimited fields.
+    data = bytearray()
+    for number, value in fields:
+        if isinstance(value, int):
+            data += encode_varint(number << 3) + encode_varint(value)
+            continue
+        if isinstance(value, list):
+            value = encode_message(value)
+        elif isinstance(value, str):
+            value = value.encode('utf-8')
+        data += encode_varint(number << 3 | 2) + encode_varint(len(value)) + value
+    return bytes(data)
+
+
+def comment_token(youtube_id, sort_by):
+    # The continuation token of the first comment page, as found in the sort menu of the watch page
+    message = [(2, [(2, youtube_id)]),
+               (3, 6),
+               (6, [(4, [(4, youtube_id), (6, sort_by)]),
+                    (8, 'comments-section')])]
+    return base64.urlsafe_b64encode(encode_message(message)).decode('ascii')
+
+
+def comment_endpoint(youtube_id, sort_by):
+    return {'commandMetadata': {'webCommandMetadata': {'sendPost': True, 'apiUrl': NEXT_API_URL}},
+            'continuationCommand': {'token': comment_token(youtube_id, sort_by),
+                                    'request': 'CONTINUATION_REQUEST_TYPE_WATCH_NEXT'}}
+
+
+def url_video_id(url):
+    match = re.search(YT_VIDEO_ID_RE, url)
+    return match.group(1) if match else None
+
+
+class YtcfgCache:
+    # Keeps the parts of ytcfg that are needed to talk to the Innertube API in a file for `ttl` seconds. With a
+    # fresh configuration, comment downloads can start from a synthesized continuation token instead of the
+    # watch page.
+
+    def __init__(self, path, ttl=24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.state = self.load()
+
+    def load(self):
+        try:
+            with io.open(self.path, 'r', encoding='utf8') as fp:
+                return json.load(fp)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def get(self, language=None):
+        # Returns a copy of the cached ytcfg, or None when there is none or it has expired
+        with self.lock:
+            if not self.state or time.time() - self.state.get('saved', 0) > self.ttl:
+                return None
+            ytcfg = json.loads(json.dumps(self.state['ytcfg']))
+        if language:
+            ytcfg['INNERTUBE_CONTEXT']['client']['hl'] = language
+        return ytcfg
+
+    def put(self, ytcfg):
+        with self.lock:
+            self.state = {'saved': time.time(), 'ytcfg': {key: ytcfg[key] for key in YTCFG_KEYS if key in ytcfg}}
+            tmp_path = self.path + '.tmp'
+            with io.open(tmp_path, 'w', encoding='utf8') as fp:
+                json.dump(self.state, fp, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+    def clear(self):
+        with self.lock:
+            self.state = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
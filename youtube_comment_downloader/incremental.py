@@ -0,0 +1,65 @@
+import itertools
+import sqlite3
+import threading
+
+LOOKUP_BATCH_SIZE = 500
+
+
+class SeenStore:
+    # SQLite backed set of comment IDs (with their reply count) that have been downloaded before. Passing it to
+    # get_comments_from_url(seen=...) only yields comments that are not in the store, only fetches reply threads
+    # of which the reply count changed, and stops paging at the first page without new top level comments.
+    # That is only right when the comments in the store come from downloads that went all the way, so a crawl
+    # stages its comments (in a temporary table, which disappears with the connection) and only promotes them
+    # into the store once it finishes.
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS seen (cid TEXT PRIMARY KEY, replies TEXT)')
+        self.connection.execute('CREATE TEMP TABLE staged (crawl INTEGER, cid TEXT, replies TEXT)')
+        self.crawls = itertools.count()
+
+    def lookup(self, cids):
+        # Returns a dict with the stored reply count of every known comment ID in `cids`
+        known = {}
+        with self.lock:
+            for offset in range(0, len(cids), LOOKUP_BATCH_SIZE):
+                batch = cids[offset:offset + LOOKUP_BATCH_SIZE]
+                query = 'SELECT cid, replies FROM seen WHERE cid IN (%s)' % ', '.join('?' * len(batch))
+                known.update(self.connection.execute(query, batch).fetchall())
+        return known
+
+    def begin(self):
+        # Returns the ID under which a crawl stages its comments
+        with self.lock:
+            return next(self.crawls)
+
+    def stage(self, crawl, comments):
+        with self.lock:
+            with self.connection:
+                self.connection.executemany('INSERT INTO staged VALUES (?, ?, ?)',
+                                            [(crawl, comment['cid'], comment.get('replies', ''))
+                                             for comment in comments])
+
+    def promote(self, crawl):
+        # The crawl finished, its comments (and the reply counts of its threads) are now known
+        with self.lock:
+            with self.connection:
+                self.connection.execute('INSERT OR REPLACE INTO seen SELECT cid, replies FROM staged '
+                                        'WHERE crawl = ? ORDER BY rowid', (crawl,))
+                self.connection.execute('DELETE FROM staged WHERE crawl = ?', (crawl,))
+
+    def discard(self, crawl):
+        # The crawl stopped early, a later one has to download these comments again
+        with self.lock:
+            with self.connection:
+                self.connection.execute('DELETE FROM staged WHERE crawl = ?', (crawl,))
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM seen').fetchone()[0]
+
+    def close(self):
+        self.connection.close()
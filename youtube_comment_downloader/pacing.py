@@ -0,0 +1,104 @@
+import collections
+import email.utils
+import random
+import threading
+import time
+
+
+def parse_retry_after(value, now=None):
+    # Retry-After is either a number of seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        moment = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, moment.timestamp() - (time.time() if now is None else now))
+
+
+class RateLimiter:
+    # Token bucket shared by all requests of a downloader (including its worker threads). The rate is adjusted
+    # based on recent outcomes: it is halved whenever Youtube pushes back (429, 5xx, timeouts) and slowly raised
+    # again while few of the recent requests were throttled. Failed requests are retried after an exponential
+    # backoff with jitter, or after the delay the server asked for in Retry-After. A backoff pauses every thread,
+    # not just the caller.
+
+    def __init__(self, rate=10.0, burst=10, min_rate=.1, max_rate=50.0, backoff=2.0, max_backoff=120.0,
+                 jitter=.5, window=50, max_error_rate=.05, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, rate)
+        self.backoff_base = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.max_error_rate = max_error_rate
+        self.clock = clock
+        self.sleep = sleep
+
+        self.lock = threading.Lock()
+        self.tokens = float(burst)
+        self.updated = clock()
+        self.paused_until = 0.0
+        self.outcomes = collections.deque(maxlen=window)
+
+        self.started = None
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.wait_time = 0.0
+
+    def acquire(self):
+        # Block until the next request may be sent
+        with self.lock:
+            now = self.clock()
+            if self.started is None:
+                self.started = now
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1  # Reserve a token, a negative balance is paid off by waiting
+            wait = max(self.paused_until - now, -self.tokens / self.rate if self.tokens < 0 else 0.0)
+            self.requests += 1
+            self.wait_time += wait
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+    def success(self):
+        with self.lock:
+            self.outcomes.append(False)
+            if sum(self.outcomes) <= len(self.outcomes) * self.max_error_rate:
+                # Additive increase while few of the recent requests were throttled
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 100.0)
+
+    def failure(self, attempt=0, retry_after=None, throttled=True, backoff=None):
+        # Record a failed request and return the delay before it should be retried. Only throttling responses
+        # (429, 5xx, timeouts) lower the rate.
+        with self.lock:
+            self.outcomes.append(throttled)
+            self.retries += 1
+            if throttled:
+                self.throttled += 1
+                self.rate = max(self.min_rate, self.rate / 2)
+
+            delay = parse_retry_after(retry_after)
+            if delay is None:
+                delay = min(self.max_backoff, (self.backoff_base if backoff is None else backoff) * 2 ** attempt)
+                delay *= 1 - self.jitter * random.random()
+            self.paused_until = max(self.paused_until, self.clock() + delay)
+            self.tokens = min(self.tokens, 0.0)
+        return delay
+
+    def stats(self):
+        with self.lock:
+            elapsed = self.clock() - self.started if self.started is not None else 0
+            return {'requests': self.requests,
+                    'retries': self.retries,
+                    'throttled': self.throttled,
+                    'wait_time': round(self.wait_time, 3),
+                    'rate': round(self.rate, 3),
+                    'requests_per_second': round(self.requests / elapsed, 3) if elapsed > 0 else 0.0}
@@ -0,0 +1,98 @@
+import re
+
+# Fields of a comment, in the order in which the downloader produces them
+FIELDS = ('cid', 'text', 'time', 'author', 'channel', 'votes', 'replies', 'photo', 'heart', 'reply', 'time_parsed',
+          'paid')
+
+COUNT_RE = re.compile(r'^\s*([\d.,]+)\s*([KMB]?)\s*$', re.IGNORECASE)
+COUNT_MULTIPLIERS = {'': 1, 'K': 1000, 'M': 1000000, 'B': 1000000000}
+
+
+def check_fields(fields):
+    # Accepts a sequence of field names or a comma separated string, returns a tuple or None for all fields
+    if fields is None:
+        return None
+    if isinstance(fields, str):
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in FIELDS]
+    if unknown:
+        raise ValueError('unknown field(s): %s (choose from %s)' % (', '.join(unknown), ', '.join(FIELDS)))
+    return tuple(fields)
+
+
+def parse_count(text):
+    # Turns a vote or reply count as displayed by Youtube ('12', '1,234', '1.2K', '3M') into an int
+    if isinstance(text, int):
+        return text
+    match = COUNT_RE.match(text or '0')
+    if not match:
+        return None
+    number, suffix = match.groups()
+    if suffix:
+        return int(round(float(number.replace(',', '.')) * COUNT_MULTIPLIERS[suffix.upper()]))
+    return int(number.replace(',', '').replace('.', ''))
+
+
+class Comment:
+    # Compact alternative to the comment dicts, produced by get_comments_from_url(compact=True). Fields that were
+    # not extracted (see fields=) are None. time_parsed and vote_count are only computed when they are used.
+    # Supports comment['field'] and comment.get('field') like a dict, and to_dict() gives the usual dict.
+
+    __slots__ = ('cid', 'text', 'time', 'author', 'channel', 'votes', 'replies', 'photo', 'heart', 'reply', 'paid',
+                 'time_parser', 'reference', 'time_text', 'parsed_time')
+
+    def __init__(self, cid=None, text=None, time=None, author=None, channel=None, votes=None, replies=None, photo=None,
+                 heart=None, reply=None, paid=None, time_parser=None, reference=None, time_text=None):
+        # None marks a field that was not extracted. time_text is what time_parsed is parsed from, when it is
+        # requested without the time field.
+        self.cid = cid
+        self.text = text
+        self.time = time
+        self.author = author
+        self.channel = channel
+        self.votes = votes
+        self.replies = replies
+        self.photo = photo
+        self.heart = heart
+        self.reply = reply
+        self.paid = paid
+        self.time_parser = time_parser
+        self.reference = reference
+        self.time_text = time if time_text is None else time_text
+
+    @property
+    def time_parsed(self):
+        try:
+            return self.parsed_time
+        except AttributeError:
+            pass
+        self.parsed_time = (self.time_parser.parse(self.time_text, self.reference)
+                            if self.time_parser and self.time_text else None)
+        return self.parsed_time
+
+    @property
+    def vote_count(self):
+        return parse_count(self.votes) if self.votes is not None else None
+
+    def __getitem__(self, field):
+        if field not in FIELDS:
+            raise KeyError(field)
+        value = getattr(self, field, None)
+        if value is None:
+            raise KeyError(field)
+        return value
+
+    def get(self, field, default=None):
+        try:
+            return self[field]
+        except KeyError:
+            return default
+
+    def __contains__(self, field):
+        return self.get(field) is not None
+
+    def to_dict(self):
+        return {field: self[field] for field in FIELDS if field in self}
+
+    def __repr__(self):
+        return 'Comment(%r)' % self.to_dict()
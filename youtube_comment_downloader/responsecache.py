@@ -0,0 +1,118 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+# Parts of INNERTUBE_CONTEXT['client'] that change the content of a response
+CONTEXT_KEYS = ('hl', 'gl', 'clientName')
+
+
+class ResponseCache:
+    # SQLite backed store of zlib compressed responses: the ytcfg and ytInitialData of watch and community pages,
+    # and the body of every continuation response, keyed by URL, continuation token and language/region. Entries
+    # expire after `ttl` seconds (None for never) and the least recently used ones are evicted once more than
+    # `max_bytes` are stored. In `offline` mode the cache is only read, expired entries are still used, and
+    # anything that is not in it is an error instead of a request.
+
+    def __init__(self, path, ttl=None, max_bytes=1 << 30, offline=False, level=6):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.level = level
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS responses '
+                                '(key TEXT PRIMARY KEY, data BLOB, size INTEGER, saved REAL, used REAL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS responses_used ON responses (used)')
+        self.size = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        self.used = {}  # Last use of entries that were read since the last write, saved with the next one
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @staticmethod
+    def key(url, token=None, context=None):
+        client = (context or {}).get('client', {})
+        parts = [url, token] + [client.get(key) for key in CONTEXT_KEYS]
+        return hashlib.sha1(json.dumps(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        # Returns the stored bytes, or None
+        with self.lock:
+            row = self.connection.execute('SELECT data, saved FROM responses WHERE key = ?', (key,)).fetchone()
+            if row and not self.offline and self.ttl is not None and time.time() - row[1] > self.ttl:
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if not self.offline:
+                self.used[key] = time.time()
+        return zlib.decompress(row[0])
+
+    def put(self, key, data):
+        if self.offline:
+            return
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        compressed = zlib.compress(data, self.level)
+        now = time.time()
+        with self.lock:
+            with self.connection:
+                self.save_used()
+                previous = self.connection.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+                self.connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                                        (key, compressed, len(compressed), now, now))
+                self.size += len(compressed) - (previous[0] if previous else 0)
+                if self.size > self.max_bytes:
+                    self.evict(self.max_bytes * 9 // 10)
+
+    def save_used(self):
+        if self.used:
+            self.connection.executemany('UPDATE responses SET used = ? WHERE key = ?',
+                                        [(used, key) for key, used in self.used.items()])
+            self.used = {}
+
+    def evict(self, target):
+        # Delete the least recently used entries until at most `target` bytes are stored
+        rows = self.connection.execute('SELECT key, size FROM responses ORDER BY used')
+        keys = []
+        for key, size in rows:
+            if self.size <= target:
+                break
+            keys.append((key,))
+            self.size -= size
+        self.connection.executemany('DELETE FROM responses WHERE key = ?', keys)
+        self.evicted += len(keys)
+
+    def get_json(self, key, loads=json.loads):
+        data = self.get(key)
+        return loads(data) if data is not None else None
+
+    def put_json(self, key, value):
+        self.put(key, json.dumps(value, ensure_ascii=False))
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evicted': self.evicted, 'bytes': self.size}
+
+    def close(self):
+        with self.lock:
+            with self.connection:
+                self.save_used()
+            self.connection.close()
@@ -0,0 +1,157 @@
+import collections
+import contextlib
+import cProfile
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+
+# Stages reported by the downloader. Time parsing is measured within extraction, the summary reports the extract
+# stage without it so that the stages add up.
+STAGES = ('bootstrap', 'request', 'decode', 'index', 'extract', 'time_parse', 'seen', 'output')
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class DownloadStats:
+    # Measurements of a download: latency, size and outcome of every request, and the number of comments and the
+    # time spent in each stage of every page. When given, `callback(event, data)` is called for every request
+    # ('request') and page ('page') as they happen.
+
+    def __init__(self, callback=None, profiler=None):
+        self.callback = callback
+        self.profiler = profiler
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.latencies = []
+        self.statuses = collections.Counter()
+        self.bytes = 0
+        self.retries = 0
+        self.avoided = 0
+        self.page_comments = []
+        self.stages = dict.fromkeys(STAGES, 0.0)
+
+    def request(self, status, latency, size=0, attempt=0):
+        with self.lock:
+            self.latencies.append(latency)
+            self.statuses[status] += 1
+            self.bytes += size
+            self.retries += attempt > 0
+            self.stages['request'] += latency
+        if self.callback:
+            self.callback('request', {'status': status, 'latency': latency, 'bytes': size, 'attempt': attempt})
+
+    def page(self, comments, page_time):
+        with self.lock:
+            self.page_comments.append(comments)
+            pages = len(self.page_comments)
+        if self.profiler:
+            self.profiler.page_done(pages)
+        if self.callback:
+            self.callback('page', {'page': pages - 1, 'comments': comments, 'page_time': page_time})
+
+    def avoid(self, requests):
+        # Continuation requests that were never made because of the reply limits or the request budget
+        with self.lock:
+            self.avoided += requests
+
+    def add(self, stage, seconds):
+        with self.lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def timer(self, stage):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start_time)
+
+    def summary(self):
+        with self.lock:
+            pages = len(self.page_comments)
+            comments = sum(self.page_comments)
+            stages = dict(self.stages)
+            stages['extract'] = max(0.0, stages['extract'] - stages['time_parse'])
+            return {'seconds': round(time.perf_counter() - self.started, 3),
+                    'requests': len(self.latencies),
+                    'statuses': {str(status): count for status, count in sorted(self.statuses.items(), key=str)},
+                    'retries': self.retries,
+                    'avoided_requests': self.avoided,
+                    'bytes': self.bytes,
+                    'latency': {'mean': round(sum(self.latencies) / len(self.latencies), 4) if self.latencies else 0.0,
+                                'p50': round(percentile(self.latencies, .5), 4),
+                                'p95': round(percentile(self.latencies, .95), 4),
+                                'max': round(max(self.latencies, default=0.0), 4)},
+                    'pages': pages,
+                    'comments': comments,
+                    'comments_per_page': round(comments / pages, 2) if pages else 0.0,
+                    'stages': {stage: round(seconds, 4) for stage, seconds in stages.items()}}
+
+    @staticmethod
+    def format(summary):
+        lines = ['%d request(s) in %.2f seconds, %d retried, %d avoided, %.1f MB received' % (
+                     summary['requests'], summary['seconds'], summary['retries'], summary['avoided_requests'],
+                     summary['bytes'] / 1e6),
+                 'Status codes: ' + ', '.join('%s: %d' % item for item in summary['statuses'].items()),
+                 'Latency: mean %(mean).3fs, p50 %(p50).3fs, p95 %(p95).3fs, max %(max).3fs' % summary['latency'],
+                 '%d page(s), %d comment(s), %.1f per page' % (
+                     summary['pages'], summary['comments'], summary['comments_per_page'])]
+        lines.append('Time per stage:')
+        lines += ['  %-20s %.3fs' % (stage, seconds) for stage, seconds in summary['stages'].items()]
+        for section, title in (('rate_limiter', 'Rate limiter:'), ('transport', 'Transport:'),
+                               ('response_cache', 'Response cache:')):
+            if section in summary:
+                lines.append(title)
+                lines += ['  %-20s %s' % item for item in summary[section].items()]
+        return '\n'.join(lines)
+
+
+class PageProfiler:
+    # Profiles the first `pages` pages of a download with cProfile ('cpu') or tracemalloc ('memory') and writes
+    # the report to `path`. Profiling starts when the profiler is created.
+
+    def __init__(self, path, pages=10, kind='cpu', top=40):
+        self.path = path
+        self.pages = pages
+        self.kind = kind
+        self.top = top
+        self.profile = None
+        if kind == 'cpu':
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        elif kind == 'memory':
+            tracemalloc.start()
+        else:
+            raise ValueError('unknown profile type: %s' % kind)
+        self.running = True
+
+    def page_done(self, pages):
+        if pages >= self.pages:
+            self.stop()
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        if self.profile:
+            self.profile.disable()
+            report = io.StringIO()
+            pstats.Stats(self.profile, stream=report).sort_stats('cumulative').print_stats(self.top)
+            self.profile.dump_stats(self.path)
+            with io.open(self.path + '.txt', 'w', encoding='utf8') as fp:
+                fp.write(report.getvalue())
+        else:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with io.open(self.path, 'w', encoding='utf8') as fp:
+                fp.write('Current %.1f MB, peak %.1f MB\n' % (current / 1e6, peak / 1e6))
+                for statistic in snapshot.statistics('lineno')[:self.top]:
+                    fp.write('%s\n' % statistic)
@@ -0,0 +1,93 @@
+import calendar
+import datetime
+import functools
+import re
+import time
+
+# Relative times as generated by Youtube ("3 days ago", "vor 3 Tagen", ...) for the languages we can resolve
+# without dateparser. Each pattern captures the amount and the unit, which is looked up in the unit table.
+RELATIVE_TIME_PATTERNS = {
+    'en': (r'^(?P<n>\d+|an?|one)\s+(?P<unit>\w+)\s+ago$',
+           {'second': 'seconds', 'seconds': 'seconds', 'minute': 'minutes', 'minutes': 'minutes',
+            'hour': 'hours', 'hours': 'hours', 'day': 'days', 'days': 'days', 'week': 'weeks', 'weeks': 'weeks',
+            'month': 'months', 'months': 'months', 'year': 'years', 'years': 'years'}),
+    'de': (r'^vor\s+(?P<n>\d+|einer?|einem)\s+(?P<unit>\w+)$',
+           {'sekunde': 'seconds', 'sekunden': 'seconds', 'minute': 'minutes', 'minuten': 'minutes',
+            'stunde': 'hours', 'stunden': 'hours', 'tag': 'days', 'tagen': 'days', 'woche': 'weeks',
+            'wochen': 'weeks', 'monat': 'months', 'monaten': 'months', 'jahr': 'years', 'jahren': 'years'}),
+    'fr': (r'^il y a\s+(?P<n>\d+|une?)\s+(?P<unit>\w+)$',
+           {'seconde': 'seconds', 'secondes': 'seconds', 'minute': 'minutes', 'minutes': 'minutes',
+            'heure': 'hours', 'heures': 'hours', 'jour': 'days', 'jours': 'days', 'semaine': 'weeks',
+            'semaines': 'weeks', 'mois': 'months', 'an': 'years', 'ans': 'years'}),
+    'es': (r'^hace\s+(?P<n>\d+|una?)\s+(?P<unit>\w+)$',
+           {'segundo': 'seconds', 'segundos': 'seconds', 'minuto': 'minutes', 'minutos': 'minutes',
+            'hora': 'hours', 'horas': 'hours', 'día': 'days', 'días': 'days', 'semana': 'weeks',
+            'semanas': 'weeks', 'mes': 'months', 'meses': 'months', 'año': 'years', 'años': 'years'}),
+    'pt': (r'^há\s+(?P<n>\d+|uma?)\s+(?P<unit>\w+)$',
+           {'segundo': 'seconds', 'segundos': 'seconds', 'minuto': 'minutes', 'minutos': 'minutes',
+            'hora': 'hours', 'horas': 'hours', 'dia': 'days', 'dias': 'days', 'semana': 'weeks',
+            'semanas': 'weeks', 'mês': 'months', 'meses': 'months', 'ano': 'years', 'anos': 'years'}),
+    'it': (r'^(?P<n>\d+|una?)\s+(?P<unit>\w+)\s+fa$',
+           {'secondo': 'seconds', 'secondi': 'seconds', 'minuto': 'minutes', 'minuti': 'minutes',
+            'ora': 'hours', 'ore': 'hours', 'giorno': 'days', 'giorni': 'days', 'settimana': 'weeks',
+            'settimane': 'weeks', 'mese': 'months', 'mesi': 'months', 'anno': 'years', 'anni': 'years'}),
+    'nl': (r'^(?P<n>\d+|een)\s+(?P<unit>\w+)\s+geleden$',
+           {'seconde': 'seconds', 'seconden': 'seconds', 'minuut': 'minutes', 'minuten': 'minutes',
+            'uur': 'hours', 'dag': 'days', 'dagen': 'days', 'week': 'weeks', 'weken': 'weeks',
+            'maand': 'months', 'maanden': 'months', 'jaar': 'years'}),
+}
+
+COMPILED_PATTERNS = {language: (re.compile(pattern, re.IGNORECASE), units)
+                     for language, (pattern, units) in RELATIVE_TIME_PATTERNS.items()}
+
+TIME_CACHE_SIZE = 4096
+
+
+def subtract_months(moment, months):
+    year, month = divmod(moment.year * 12 + moment.month - 1 - months, 12)
+    day = min(moment.day, calendar.monthrange(year, month + 1)[1])
+    return moment.replace(year=year, month=month + 1, day=day)
+
+
+def parse_relative_time(text, language, reference):
+    languages = [language.split('-')[0].lower()] if language else []
+    if 'en' not in languages:
+        languages.append('en')  # Youtube falls back to English for unsupported languages
+
+    for language in languages:
+        pattern, units = COMPILED_PATTERNS.get(language, (None, None))
+        match = pattern.match(text) if pattern else None
+        unit = units.get(match.group('unit').lower()) if match else None
+        if not unit:
+            continue
+        amount = int(match.group('n')) if match.group('n').isdigit() else 1
+        moment = datetime.datetime.fromtimestamp(reference)
+        if unit == 'months' or unit == 'years':
+            return subtract_months(moment, amount * (12 if unit == 'years' else 1)).timestamp()
+        return (moment - datetime.timedelta(**{unit: amount})).timestamp()
+    return None
+
+
+@functools.lru_cache(maxsize=TIME_CACHE_SIZE)
+def resolve_time(text, language, reference):
+    timestamp = parse_relative_time(text, language, reference)
+    if timestamp is None:
+        # Not a phrase we know, use the (slow to import and slow to run) general purpose parser
+        import dateparser
+        parsed = dateparser.parse(text, settings={'RELATIVE_BASE': datetime.datetime.fromtimestamp(reference)})
+        timestamp = parsed.timestamp() if parsed else None
+    return timestamp
+
+
+class TimeParser:
+    # Turns the publishedTime of a comment into a timestamp relative to the current time (in whole seconds).
+    # Results are cached by (text, language, reference time).
+
+    def __init__(self, language=None):
+        self.language = language
+
+    def parse(self, text, reference=None):
+        text = text.split('(')[0].strip()  # Drop the '(edited)' suffix
+        if not text:
+            return None
+        return resolve_time(text, self.language, int(time.time() if reference is None else reference))
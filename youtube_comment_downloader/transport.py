@@ -0,0 +1,82 @@
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/79.0.3945.130 Safari/537.36'
+
+# urllib3 decodes brotli itself when one of the brotli packages is installed
+ACCEPT_ENCODING = 'br, gzip, deflate' if brotli else 'gzip, deflate'
+PREFIXES = ('https://www.youtube.com', 'https://consent.youtube.com')
+
+
+class Transport:
+    # The HTTP side of a downloader: a session whose connection pool is large enough for the threads sharing it
+    # (reply workers, batch jobs), compressed responses and JSON decoding with orjson when it is installed. Counts
+    # the bytes received over the wire and after decompression, and the time spent decoding JSON. Pass `adapter`
+    # (or call mount) to serve the requests by something else than the network, e.g. a fake Youtube in tests.
+
+    def __init__(self, pool_connections=4, pool_maxsize=32, adapter=None, fast_json=True):
+        self.lock = threading.Lock()
+        self.responses = 0
+        self.wire_bytes = 0
+        self.body_bytes = 0
+        self.measured_bytes = 0  # Bytes on the wire of the responses whose body size is known
+        self.decode_time = 0.0
+        self.loads = orjson.loads if fast_json and orjson else json.loads
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+        self.session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+        self.session.cookies.set('CONSENT', 'YES+cb', domain='.youtube.com')
+        self.mount(adapter or HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize))
+
+    def mount(self, adapter):
+        for prefix in PREFIXES:
+            self.session.mount(prefix, adapter)
+
+    def received(self, response, body_bytes=None):
+        # Account for a response once its body has been read (or the connection closed). `body_bytes` is the size
+        # after decompression, when it is known.
+        try:
+            wire_bytes = response.raw.tell()
+        except AttributeError:
+            wire_bytes = int(response.headers.get('Content-Length') or 0)
+        with self.lock:
+            self.responses += 1
+            self.wire_bytes += wire_bytes
+            if body_bytes is not None:
+                self.body_bytes += body_bytes
+                self.measured_bytes += wire_bytes
+
+    def decode(self, response):
+        start_time = time.perf_counter()
+        try:
+            return self.loads(response.content)
+        finally:
+            with self.lock:
+                self.decode_time += time.perf_counter() - start_time
+
+    def stats(self):
+        with self.lock:
+            return {'responses': self.responses,
+                    'wire_bytes': self.wire_bytes,
+                    'body_bytes': self.body_bytes,
+                    'compression_ratio': round(self.body_bytes / self.measured_bytes, 2) if self.measured_bytes else 0.0,
+                    'decode_seconds': round(self.decode_time, 4),
+                    'accept_encoding': ACCEPT_ENCODING,
+                    'json': 'orjson' if self.loads is not json.loads else 'json'}
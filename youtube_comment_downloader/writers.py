@@ -0,0 +1,208 @@
+import csv
+import gzip
+import io
+import json
+import os
+import sqlite3
+import sys
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from .community import NESTED_FIELDS
+from .record import FIELDS
+
+INDENT = 4
+
+FORMATS = ('json', 'csv', 'sqlite')
+COMPRESSIONS = ('gzip', 'zstd')
+
+
+def to_json(comment, indent=None):
+    comment_str = json.dumps(comment, ensure_ascii=False, indent=indent)
+    if indent is None:
+        return comment_str
+    # Newlines inside strings are escaped, so every newline starts a line. Unlike splitlines, this leaves the
+    # characters that Python also treats as line breaks (e.g. U+2028) alone.
+    padding = ' ' * (2 * indent) if indent else ''
+    return padding + comment_str.replace('\n', '\n' + padding)
+
+
+def fast_json(comment):
+    # orjson produces the same output as json.dumps(comment, ensure_ascii=False) minus the spaces
+    return orjson.dumps(comment).decode('utf-8')
+
+
+class Writer:
+    # Buffers records and writes them in batches of `batch_size`
+
+    def __init__(self, fp, batch_size=1000):
+        self.fp = fp
+        self.batch_size = batch_size
+        self.buffer = []
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, record):
+        if not isinstance(record, dict):
+            record = record.to_dict()  # A record.Comment, as produced with compact=True
+        self.buffer.append(self.encode(record))
+        self.count += 1
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def encode(self, record):
+        return record
+
+    def flush(self):
+        if self.buffer:
+            self.fp.write(''.join(self.buffer))
+            self.buffer = []
+        self.fp.flush()
+
+    def sync(self):
+        # Flush and fsync the output, a no-op once the writer has been closed
+        if self.fp.closed:
+            return
+        self.flush()
+        os.fsync(self.fp.fileno())
+
+    def close(self):
+        self.flush()
+        self.fp.close()
+
+
+class NDJSONWriter(Writer):
+
+    def __init__(self, fp, batch_size=1000, fast=True):
+        super().__init__(fp, batch_size)
+        self.dumps = fast_json if fast and orjson else (lambda record: json.dumps(record, ensure_ascii=False))
+
+    def encode(self, record):
+        return self.dumps(record) + '\n'
+
+
+class JSONWriter(Writer):
+    # Indented JSON document of the form {"comments": [...]}
+
+    def __init__(self, fp, batch_size=1000, key='comments'):
+        super().__init__(fp, batch_size)
+        self.fp.write('{\n' + ' ' * INDENT + '"%s": [\n' % key)
+
+    def encode(self, record):
+        return (',\n' if self.count else '') + to_json(record, indent=INDENT)
+
+    def close(self):
+        self.flush()
+        self.fp.write(('\n' if self.count else '') + ' ' * INDENT + ']\n}')
+        self.fp.close()
+
+
+class CSVWriter(Writer):
+
+    def __init__(self, fp, batch_size=1000, fields=FIELDS):
+        super().__init__(fp, batch_size)
+        self.csv_writer = csv.DictWriter(fp, fieldnames=fields, extrasaction='ignore', lineterminator='\n')
+        self.csv_writer.writeheader()
+        self.nested = [field for field in fields if field in NESTED_FIELDS]
+
+    def encode(self, record):
+        if self.nested:
+            record = dict(record, **{field: to_json(record[field]) for field in self.nested if field in record})
+        return record
+
+    def flush(self):
+        if self.buffer:
+            self.csv_writer.writerows(self.buffer)
+            self.buffer = []
+        self.fp.flush()
+
+
+class SQLiteWriter(Writer):
+    # Stores records in the `table` table, every batch is inserted in a single transaction
+
+    def __init__(self, path, batch_size=1000, fields=FIELDS, table='comments', mode='w'):
+        super().__init__(sqlite3.connect(path), batch_size)
+        self.fields = fields
+        if mode == 'w':
+            # Like the other formats, start over instead of adding to the rows of an earlier download
+            with self.fp:
+                self.fp.execute('DROP TABLE IF EXISTS %s' % table)
+        self.fp.execute('CREATE TABLE IF NOT EXISTS %s (%s)' % (table, ', '.join(fields)))
+        self.insert = 'INSERT INTO %s VALUES (%s)' % (table, ', '.join('?' * len(fields)))
+        nested = [field in NESTED_FIELDS for field in fields]
+        self.nested = nested if any(nested) else None
+
+    def encode(self, record):
+        values = tuple(record.get(field) for field in self.fields)
+        if self.nested:
+            values = tuple(to_json(value) if nested and value is not None else value
+                           for value, nested in zip(values, self.nested))
+        return values
+
+    def flush(self):
+        if self.buffer:
+            with self.fp:
+                self.fp.executemany(self.insert, self.buffer)
+            self.buffer = []
+
+    def sync(self):
+        # A committed transaction is already durable
+        self.flush()
+
+
+def open_text(path, mode='w', compression=None):
+    if compression == 'gzip':
+        return gzip.open(path, mode + 't', encoding='utf8')
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError('the zstandard package is required for zstd compression')
+        return io.TextIOWrapper(zstandard.open(path, mode + 'b'), encoding='utf8')
+    # Writers do their own batching, a large buffer keeps the number of system calls down
+    return io.open(path, mode, encoding='utf8', buffering=1 << 20)
+
+
+def open_writer(path, format='json', compression=None, pretty=False, mode='w', batch_size=1000, fields=None):
+    # Open a writer for `path`, which can be used both from the command line and as a library:
+    #   with open_writer('comments.csv', 'csv') as writer:
+    #       for comment in downloader.get_comments(youtube_id):
+    #           writer.write(comment)
+    if format not in FORMATS:
+        raise ValueError('unknown output format: %s' % format)
+    if compression and compression not in COMPRESSIONS:
+        raise ValueError('unknown compression: %s' % compression)
+    if format == 'sqlite':
+        if compression:
+            raise ValueError('sqlite output cannot be compressed')
+        return SQLiteWriter(path, batch_size, fields or FIELDS, mode=mode)
+    fp = open_text(path, mode, compression)
+    if format == 'csv':
+        return CSVWriter(fp, batch_size, fields or FIELDS)
+    return JSONWriter(fp, batch_size) if pretty else NDJSONWriter(fp, batch_size)
+
+
+class Progress:
+    # Reports the number of downloaded items on a single line, at most every `interval` seconds
+
+    def __init__(self, label='comment(s)', interval=.25, stream=None):
+        self.label = label
+        self.interval = interval
+        self.stream = stream or sys.stdout
+        self.last_update = 0
+
+    def update(self, count, force=False):
+        now = time.time()
+        if force or now - self.last_update >= self.interval:
+            self.stream.write('Downloaded %d %s\r' % (count, self.label))
+            self.stream.flush()
+            self.last_update = now